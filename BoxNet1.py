@@ -1,3 +1,10 @@
+import logging
+
+from box_index import BoxIndex
+
+log = logging.getLogger(__name__)
+
+
 class Box:
     def __init__(self, color, positions):
         self.color = color
@@ -10,17 +17,26 @@ class Agent:
 
 
 class BoxNet1:
-    def __init__(self):
-        self.GRID_WIDTH = 2
-        self.GRID_HEIGHT = 4
+    """
+    rows × cols cells with one agent each (agent id = row * cols + col).
+    Without *boxes* / *goals* it is the original 2×4 board; scenarios.py
+    generates larger ones. GRID_WIDTH holds the rows, GRID_HEIGHT the columns.
+    """
+    def __init__(self, rows=2, cols=4, boxes=None, goals=None):
+        self.GRID_WIDTH = rows
+        self.GRID_HEIGHT = cols
         self.grid = [[0 for _ in range(self.GRID_WIDTH)] for _ in range(self.GRID_HEIGHT)]
-        self.boxes = [Box("blue", [(0,0)]), Box("yellow", [(0,1), (0,3)]), Box("red", [(1,2), (1,2)])]
-        self.goals = {
-            "blue": [(1,1)],
-            "yellow": [(1,0), (1,3)],
-            "red": [(0,0), (0,2)]
-        }        
-        self.agents = [Agent((0,0)), Agent((0,1)), Agent((0,2)), Agent((0,3)), Agent((1,0)), Agent((1,1)), Agent((1,2)), Agent((1,3))]
+        if boxes is None:
+            boxes = [Box("blue", [(0,0)]), Box("yellow", [(0,1), (0,3)]), Box("red", [(1,2), (1,2)])]
+            goals = {
+                "blue": [(1,1)],
+                "yellow": [(1,0), (1,3)],
+                "red": [(0,0), (0,2)]
+            }
+        self.boxes = boxes
+        self.goals = goals
+        self.index = BoxIndex(self.boxes)
+        self.agents = [Agent((r, c)) for r in range(rows) for c in range(cols)]
 
     def move_box(self, box, box_location, direction):
         change = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
@@ -28,15 +44,16 @@ class BoxNet1:
             return False
         new_x, new_y = box_location[0] + change[direction][0], box_location[1] + change[direction][1]
         if new_x < 0 or new_x >= self.GRID_WIDTH or new_y < 0 or new_y >= self.GRID_HEIGHT:
-            print("Invalid move")
+            log.debug("Invalid move")
             return False
         if box_location in box.positions:
             box.positions.remove(box_location)
             box.positions.append((new_x, new_y))
-            print(f"{box.color} box moved to {(new_x, new_y)}")
+            self.index.move(box, box_location, (new_x, new_y))
+            log.debug("%s box moved to %s", box.color, (new_x, new_y))
             return True
         else:
-            print("Box not in position")
+            log.debug("Box not in position")
             return False
         
 
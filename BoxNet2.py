@@ -1,3 +1,7 @@
+# (dx, dy, corner_id): the point (x, y) is corner `corner_id` of cell (x + dx, y + dy)
+CORNER_OFFSETS = [(0, 0, "SE"), (-1, 0, "SW"), (0, -1, "NE"), (-1, -1, "NW")]
+
+
 class Box:
     def __init__(self, color, position=None):
         self.color = color
@@ -8,7 +12,7 @@ class Box:
 class Corner:
     def __init__(self, position, connected_cells):
         self.position = position  # (x, y, corner_id) where corner_id is NE, NW, SE, SW
-        self.connected_cells = connected_cells  # List of cell coordinates this corner connects
+        self.connected_cells = connected_cells  # Tuple of cell coordinates this corner connects
         self.occupied_by = None  # Box occupying this corner, None if empty
 
 
@@ -21,20 +25,17 @@ class Agent:
         actions = []
         cell_x, cell_y = self.cell_position
 
-        # Get corners in this cell
-        cell_corners = []
-        for corner in environment.corners:
-            if (cell_x, cell_y) in corner.connected_cells:
-                cell_corners.append(corner)
+        # The cell's four corners, labelled as seen from this cell
+        cell_corners = environment.cell_corners[(cell_x, cell_y)]
 
         # Get boxes at corners in this cell
-        for corner in cell_corners:
+        for _, corner in cell_corners:
             if corner.occupied_by:
                 # Action 1: Move box from this corner to another corner in the cell
-                for target_corner in cell_corners:
-                    if target_corner != corner and not target_corner.occupied_by:
+                for label, target_corner in cell_corners:
+                    if target_corner is not corner and not target_corner.occupied_by:
                         actions.append(
-                            f"move_box_corner_to_corner({corner.occupied_by.color}, {target_corner.position})")
+                            f"move_box_corner_to_corner({corner.occupied_by.color}, {label})")
 
                 # Action 2: Move box from corner to goal if color matches
                 box_color = corner.occupied_by.color
@@ -54,22 +55,28 @@ class BoxNet2:
         self.grid_width = grid_width
         self.grid_height = grid_height
 
-        # Initialize corners
-        self.corners = []
+        # Initialize corners: one Corner per grid point, shared by the up to
+        # 4 cells around it. Each cell names the point with its own label,
+        # (x, y, corner_id); every label maps to the same Corner.
+        self.corners = []            # unique corners
+        self.corner_at = {}          # (x, y) → Corner
+        self.corner_by_label = {}    # (x, y, corner_id) → Corner
+        self.cell_corners = {(cx, cy): [] for cx in range(grid_width) for cy in range(grid_height)}
         for x in range(grid_width + 1):
             for y in range(grid_height + 1):
                 # Each corner connects to up to 4 cells
-                connected_cells = []
-                for dx, dy, corner_id in [(0, 0, "SE"), (-1, 0, "SW"), (0, -1, "NE"), (-1, -1, "NW")]:
-                    cell_x, cell_y = x + dx, y + dy
-                    if 0 <= cell_x < grid_width and 0 <= cell_y < grid_height:
-                        connected_cells.append((cell_x, cell_y))
-
-                if connected_cells:  # Only create corner if it connects to at least one cell
-                    for dx, dy, corner_id in [(0, 0, "SE"), (-1, 0, "SW"), (0, -1, "NE"), (-1, -1, "NW")]:
-                        cell_x, cell_y = x + dx, y + dy
-                        if 0 <= cell_x < grid_width and 0 <= cell_y < grid_height:
-                            self.corners.append(Corner((x, y, corner_id), connected_cells))
+                labels = [((x + dx, y + dy), (x, y, corner_id)) for dx, dy, corner_id in CORNER_OFFSETS
+                          if 0 <= x + dx < grid_width and 0 <= y + dy < grid_height]
+                if not labels:
+                    continue
+                corner = Corner(labels[0][1], tuple(cell for cell, _ in labels))
+                self.corners.append(corner)
+                self.corner_at[(x, y)] = corner
+                for cell, label in labels:
+                    self.corner_by_label[label] = corner
+                    self.cell_corners[cell].append((label, corner))
+        # per cell: ((label, Corner), ...) for its 4 corners
+        self.cell_corners = {cell: tuple(corners) for cell, corners in self.cell_corners.items()}
 
         # Initialize boxes, goals, and agents (to be set by the scenario)
         self.boxes = []
@@ -79,11 +86,7 @@ class BoxNet2:
     def place_box_at_corner(self, box, corner_position):
         """Place a box at a specified corner"""
         # Find the corner
-        target_corner = None
-        for corner in self.corners:
-            if corner.position == corner_position:
-                target_corner = corner
-                break
+        target_corner = self.corner_by_label.get(corner_position)
 
         if not target_corner:
             print(f"Corner {corner_position} not found")
@@ -104,23 +107,16 @@ class BoxNet2:
         agent_x, agent_y = agent.cell_position
 
         # Find the source corner with the box
-        source_corner = None
-        for corner in self.corners:
-            if (agent_x,
-                agent_y) in corner.connected_cells and corner.occupied_by and corner.occupied_by.color == box_color:
-                source_corner = corner
-                break
+        source_corner = self._box_corner(agent.cell_position, box_color)
 
         if not source_corner:
             print(f"No {box_color} box found at any corner in cell ({agent_x}, {agent_y})")
             return False
 
         # Find the target corner
-        target_corner = None
-        for corner in self.corners:
-            if corner.position == target_corner_position and (agent_x, agent_y) in corner.connected_cells:
-                target_corner = corner
-                break
+        target_corner = self.corner_by_label.get(target_corner_position)
+        if target_corner and (agent_x, agent_y) not in target_corner.connected_cells:
+            target_corner = None
 
         if not target_corner:
             print(
@@ -154,12 +150,7 @@ class BoxNet2:
             return False
 
         # Find the source corner with the box
-        source_corner = None
-        for corner in self.corners:
-            if (agent_x,
-                agent_y) in corner.connected_cells and corner.occupied_by and corner.occupied_by.color == box_color:
-                source_corner = corner
-                break
+        source_corner = self._box_corner(agent.cell_position, box_color)
 
         if not source_corner:
             print(f"No {box_color} box found at any corner in cell ({agent_x}, {agent_y})")
@@ -173,6 +164,13 @@ class BoxNet2:
         print(f"{box_color} box moved from {source_corner.position} to goal at {goal_position}")
         return True
 
+    def _box_corner(self, cell, box_color):
+        """The corner of *cell* holding a *box_color* box, or None."""
+        for _, corner in self.cell_corners.get(cell, ()):
+            if corner.occupied_by and corner.occupied_by.color == box_color:
+                return corner
+        return None
+
     def do_nothing(self, agent):
         """Agent does nothing this turn"""
         print(f"Agent at {agent.cell_position} does nothing")
@@ -231,16 +229,13 @@ class BoxNet2:
         state = {}
 
         # Add cell contents (for visualization)
+        targets = {}
+        for color, positions in self.goals.items():
+            for pos in positions:
+                targets.setdefault((pos[0], pos[1]), []).append(f"target_{color}")
         for x in range(self.grid_width):
             for y in range(self.grid_height):
-                cell_key = f"{x}_{y}"
-                state[cell_key] = []
-
-                # Add goals in this cell
-                for color, positions in self.goals.items():
-                    for pos in positions:
-                        if pos[0] == x and pos[1] == y:
-                            state[cell_key].append(f"target_{color}")
+                state[f"{x}_{y}"] = targets.get((x, y), [])
 
         # Add corner occupancy
         corner_occupancy = self.get_corner_occupancy()
@@ -1,3 +1,10 @@
+import logging
+
+from box_index import BoxIndex
+
+log = logging.getLogger(__name__)
+
+
 class Box:
     def __init__(self, color, positions):
         self.color = color
@@ -9,45 +16,55 @@ class Agent:
 
 
 class BoxNet2:
-    def __init__(self):
-        self.GRID_WIDTH = 5
-        self.GRID_HEIGHT = 3
+    """
+    rows × cols box corners; one agent per cell owns its four corners
+    (agent id = row * (cols - 1) + col of the cell). Without *boxes* /
+    *goals* it is the original 3×5 board; scenarios.py generates larger ones.
+    """
+    def __init__(self, rows=3, cols=5, boxes=None, goals=None):
+        self.GRID_WIDTH = cols
+        self.GRID_HEIGHT = rows
         self.grid = [[0 for _ in range(self.GRID_WIDTH)] for _ in range(self.GRID_HEIGHT)]
-        self.boxes = [Box("blue", [(1,0)]), Box("yellow", [(1,3)]), Box("green", [(0,1)]), Box("purple", [(2,4)]), Box("red", [(1,2)])]
-        self.goals = {
-            "purple": [(0,0), (0,1), (1,0), (1,1)],
-            "yellow": [(1,0), (2,0), (1,1), (2,1)],
-            "blue": [(1,1), (1,2), (2,1), (2,2)],
-            "green": [(1,3), (1,4), (2,3), (2,4)],
-            "red": [(0,2), (0,3), (1,2), (1,3)]
-        }        
-        self.agents = [Agent([(0,0), (0,1), (1,0), (1,1)]), Agent([(0,1), (0,2), (1,1), (1,2)]), Agent([(0,2), (0,3), (1,2), (1,3)]), Agent([(0,3), (0,4), (1,3), (1,4)]),
-                       Agent([(1,0), (1,1), (2,0), (2,1)]), Agent([(1,1), (1,2), (2,1), (2,2)]), Agent([(1,2), (1,3), (2,2), (2,3)]), Agent([(1,3), (1,4), (2,3), (2,4)])]
+        if boxes is None:
+            boxes = [Box("blue", [(1,0)]), Box("yellow", [(1,3)]), Box("green", [(0,1)]), Box("purple", [(2,4)]), Box("red", [(1,2)])]
+            goals = {
+                "purple": [(0,0), (0,1), (1,0), (1,1)],
+                "yellow": [(1,0), (2,0), (1,1), (2,1)],
+                "blue": [(1,1), (1,2), (2,1), (2,2)],
+                "green": [(1,3), (1,4), (2,3), (2,4)],
+                "red": [(0,2), (0,3), (1,2), (1,3)]
+            }
+        self.boxes = boxes
+        self.goals = goals
+        self.index = BoxIndex(self.boxes)
+        self.agents = [Agent([(r, c), (r, c + 1), (r + 1, c), (r + 1, c + 1)])
+                       for r in range(rows - 1) for c in range(cols - 1)]
 
     def move_box(self, box, box_location, direction):
         change = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
         new_x, new_y = box_location[0] + change[direction][0], box_location[1] + change[direction][1]
     
         if new_x < 0 or new_x >= self.GRID_HEIGHT or new_y < 0 or new_y >= self.GRID_WIDTH:
-            print("Invalid move")
+            log.debug("Invalid move")
             return False
         
         if box_location in box.positions:
             box.positions.remove(box_location)
             box.positions.append((new_x, new_y))
+            self.index.move(box, box_location, (new_x, new_y))
             if (new_x, new_y) in self.goals[box.color]:
                   self.move_to_goal(box.color)
-            print(f"{box.color} box moved to {(new_x, new_y)}")
+            log.debug("%s box moved to %s", box.color, (new_x, new_y))
             return True
         else:
-            print("Box not in position")
+            log.debug("Box not in position")
             return False
         
     def move_to_goal(self, color):
         self.goals[color] = []
-        for i, box in enumerate(self.boxes):
-            if box.color == color:
-                self.boxes[i].positions = []
+        for box in self.index.of_color(color):
+            self.index.clear(box)
+            box.positions = []
 
 
         
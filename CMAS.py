@@ -1,14 +1,13 @@
+import logging
 import BoxNet1
 import BoxNet2_test
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
-import time
-import re
-
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import executor
+import latency
+import llm
+import plan_parser
+import structured_output
 
+@latency.timed("prompt")
 def format_prompt(env):
     """Format prompt for centralized CMAS planner."""
     if isinstance(env, BoxNet1.BoxNet1):
@@ -74,81 +73,47 @@ def format_prompt(env):
         lines.append("- Agent [id]: move [color] box to goal")
     return "\n".join(lines)
 
-def call_llm(prompt):
-    """Send the centralized prompt to the LLM."""
-    response = client.chat.completions.create(
-        model="gpt-4.1",  # or "gpt-3.5-turbo"
-        messages=[{"role": "system", "content": "You are a helpful robot task planner."},
-                  {"role": "user", "content": prompt}],
-        temperature=0
-    )
-    return response.choices[0].message.content, response.usage.total_tokens
+MODEL = "gpt-4.1"  # or "gpt-3.5-turbo"
+
+def _messages(prompt):
+    return [{"role": "system", "content": "You are a helpful robot task planner."},
+            {"role": "user", "content": prompt}]
+
+def call_llm(prompt, env=None, structured=False):
+    """Send the centralized prompt to the LLM (structured mode needs *env*)."""
+    if structured:
+        text, usage, _ = structured_output.complete_plan(
+            _messages(prompt), env, MODEL, "CMAS", temperature=0)
+        return text, usage["total_tokens"]
+    text, usage = llm.complete(_messages(prompt), model=MODEL, temperature=0)
+    structured_output.record_output("CMAS", "text", usage)
+    return text, usage["total_tokens"]
+
+def stream_plan(env, prompt):
+    """
+    Stream the centralized plan, validating each action on a scratch copy of
+    *env* and cancelling the generation at the first invalid one.
+    Returns (text, total_tokens, actions, failed_at).
+    """
+    text, usage, actions, failed_at = executor.stream_validated_plan(
+        _messages(prompt), env, MODEL, temperature=0)
+    return text, usage["total_tokens"], actions, failed_at
 
 def parse_llm_plan(text):
-    actions = []
-
-    pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)\]?)?"
-    pattern_nothing = r".*?Agent (\d+): do nothing"
-    pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
-
-    for line in text.strip().split('\n'):
-        move_match = re.match(pattern_move, line.strip())
-        nothing_match = re.match(pattern_nothing, line.strip())
-        move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
-
-        if move_match:
-            agent_id = int(move_match.group(1))
-            color = move_match.group(2)
-            from_pos = (int(move_match.group(3)), int(move_match.group(4)))
-            to_pos = (int(move_match.group(5)), int(move_match.group(6)))
-
-            direction = move_match.group(7)
-            actions.append((agent_id, color, from_pos, direction))
-        
-        elif nothing_match:
-            agent_id = int(nothing_match.group(1))
-            actions.append((agent_id, "none", None, "stay"))
-        elif move_to_goal_match:
-            agent_id = int(move_to_goal_match.group(1))
-            color = move_to_goal_match.group(2)
-            actions.append((agent_id, color, None, "goal"))
-
-    return actions
-
-def execute_plan(env, actions):
-    for agent_id, color, from_pos, direction in actions:
-        if color == "none":
-            print(f"Agent {agent_id} does nothing")
-            continue
-        if direction == "goal":
-            env.move_to_goal(color)
-            continue
-        # Find the box object by color and current position
-        box = next(
-            (b for b in env.boxes if b.color == color and from_pos in b.positions),
-            None
-        )
+    return plan_parser.parse_plan(text)
 
-        if box:
-            success = env.move_box(box, from_pos, direction)
-            status = "✅ Success" if success else "❌ Failed"
-            print(f"{status}: Agent {agent_id} moved {color} box from {from_pos} {direction}")
-            if not success:
-                return False
-        else:
-            print(f"⚠️ Agent {agent_id} could not find {color} box at {from_pos}")
-            return False
-        
-        time.sleep(1) # For debugging
-    print("\n🧱 Final Environment State:")
-    print(env.goals)
-    for box in env.boxes:
-        print(f"{box.color} box positions: {box.positions}")
-    
-    return True
+def execute_plan(env, actions, pace=0.0):
+    """Run the plan, stopping at the first failing action; True if all succeeded."""
+    return executor.execute_plan(env, actions, pace=pace).ok
 
-def runCMAS(env):
+def runCMAS(env, stream=False):
     prompt = format_prompt(env)
+    if stream:
+        response, total_tokens, actions, failed_at = stream_plan(env, prompt)
+        if failed_at is not None:
+            print(f"Plan aborted at invalid action {failed_at}: {actions[failed_at]}")
+            actions = actions[:failed_at]
+        return execute_plan(env, actions)
     response, total_tokens = call_llm(prompt)
     print(response)
     actions = parse_llm_plan(response)
@@ -157,5 +122,6 @@ def runCMAS(env):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     env = BoxNet1.BoxNet1()
     runCMAS(env)
@@ -1,24 +1,54 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import json
+import logging
 import BoxNet1
 import BoxNet2_test
+import convergence
+import executor
+import latency
+import ledger
+import tracing
+import llm
+import plan_parser
+import structured_output
 import re
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-CELL_GRID = [[0, 1, 2, 3], [4, 5, 6, 7]]  # 2x4 grid flattened
-NUM_AGENTS = 8
+log = logging.getLogger(__name__)
 
-_MOVE_PAT  = re.compile(r".*?Agent\s*(\d+):\s*move\s+(\w+)\s+box\s+from\s*\((\d+),\s*(\d+)\)\s*to\s*\((\d+),\s*(\d+)\).*?(\bup|\bdown|\bleft|\bright)?", re.I)
-_GOAL_PAT  = re.compile(r".*?Agent\s*(\d+):\s*move\s+(\w+)\s+box\s+to\s+goal", re.I)
-_NONE_PAT  = re.compile(r".*?Agent\s*(\d+):\s*do\s+nothing", re.I)
+HISTORY_WINDOW = 3   # neighbour replies shown to each agent (None = all)
 
 
-# DMAS state
-turn_history = []
-#env = BoxNet1.BoxNet1()
+
+class DialogueHistory:
+    """
+    Replies of one DMAS session. Each agent is shown only its neighbours'
+    last *window* replies, plus (with *digest*) one line per neighbour
+    summarising the action it proposed before that window.
+    """
+    def __init__(self, adjacency, window=HISTORY_WINDOW, digest=False):
+        self.adjacency = adjacency
+        self.window = window
+        self.digest = digest
+        self.messages = []   # (agent id, reply) in the order they were produced
+
+    def record(self, agent_id, reply):
+        self.messages.append((agent_id, reply))
+
+    def view(self, agent_id):
+        heard = [(sender, reply) for sender, reply in self.messages
+                 if sender in self.adjacency[agent_id]]
+        if self.window is None or len(heard) <= self.window:
+            return [reply for _, reply in heard]
+        older, recent = heard[:-self.window], heard[-self.window:]
+        view = [reply for _, reply in recent]
+        if self.digest:
+            latest = {}
+            for sender, reply in older:
+                latest[sender] = reply.splitlines()[0][:80] if reply else ""
+            summary = "; ".join(f"Agent {sender} earlier: {line}" for sender, line in sorted(latest.items()))
+            view.insert(0, f"[{len(older)} older turns] {summary}")
+        return view
+
+@latency.timed("prompt")
 def build_prompt(env, agent_id, boxes, goals, turn_history):
     # Extract this agent's cell position
     cell_boxes = []
@@ -27,16 +57,18 @@ def build_prompt(env, agent_id, boxes, goals, turn_history):
         if g == env.agents[agent_id].position:
             cell_goals.append({c: g})
             
-    for b in boxes:
+    cells = _agent_cells(env.agents[agent_id])
+    for b in env.index.near(cells):
         for val in b.positions:
-            if val in env.agents[agent_id].position:
+            if val in cells:
                 cell_boxes.append({b.color: val})
 
 
     #print(f"Agent {agent_id} cell boxes: {cell_boxes}")
     
     if (isinstance(env, BoxNet1.BoxNet1)):
-        row, col = agent_id // 4, agent_id % 4
+        row, col = env.agents[agent_id].position
+        rows, cols = executor.grid_shape(env)
         cell_boxes = []
         cell_goals = []
         for c, g in goals.items():
@@ -44,7 +76,7 @@ def build_prompt(env, agent_id, boxes, goals, turn_history):
             for val in g:
                 if (row, col) == val:
                     cell_goals.append({c: (row,col)})
-        for b in boxes:
+        for b in env.index.near([(row, col)]):
             for val in b.positions:
                 if (row, col) == val:
                     cell_boxes.append({b.color: (row,col)})
@@ -54,7 +86,7 @@ def build_prompt(env, agent_id, boxes, goals, turn_history):
                     You can move boxes to their goals or to other cells. You can also do nothing.
                     If the box is in your cell and there is a goal with the same color as the box, you can move it to the goal.
                     You can only talk to adjacent robots, not the whole team.
-                    The grid is divided into 2 rows and 4 columns, so (0,0) is top left and (1,3) is bottom right.
+                    The grid is divided into {rows} rows and {cols} columns, so (0,0) is top left and ({rows - 1},{cols - 1}) is bottom right.
                     Boxes in your cell: {json.dumps(cell_boxes)}
                     Goals in your cell: {json.dumps(cell_goals)}
 
@@ -92,44 +124,19 @@ def build_prompt(env, agent_id, boxes, goals, turn_history):
         prompt = "\n".join(prompt)
     return prompt
 def parse_llm_plan(text):
-    actions = []
-
-    pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)\]?)?"
-    pattern_nothing = r".*?Agent (\d+): do nothing"
-    pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
-
-    for line in text.strip().split('\n'):
-        move_match = re.match(pattern_move, line.strip())
-        nothing_match = re.match(pattern_nothing, line.strip())
-        move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
-
-        if move_match:
-            agent_id = int(move_match.group(1))
-            color = move_match.group(2)
-            from_pos = (int(move_match.group(3)), int(move_match.group(4)))
-            to_pos = (int(move_match.group(5)), int(move_match.group(6)))
-
-            direction = move_match.group(7)
-            actions.append((agent_id, color, from_pos, direction))
-        
-        elif nothing_match:
-            agent_id = int(nothing_match.group(1))
-            actions.append((agent_id, "none", None, "stay"))
-        elif move_to_goal_match:
-            agent_id = int(move_to_goal_match.group(1))
-            color = move_to_goal_match.group(2)
-            actions.append((agent_id, color, None, "goal"))
-
-    return actions
-def query_llm(prompt):
-    resp = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role":"user","content":prompt}],
-        temperature=0
-    )
-    toks = resp.usage.total_tokens
-    print(f"Total tokens used: {toks}")
-    return resp.choices[0].message.content, toks
+    return plan_parser.parse_plan(text)
+def query_llm(prompt, env=None, structured=False):
+    messages = [{"role":"user","content":prompt}]
+    if structured:
+        text, usage, _ = structured_output.complete_plan(messages, env, "gpt-4.1", "DMAS", temperature=0)
+    else:
+        text, usage = llm.complete(messages, model="gpt-4.1", temperature=0)
+        structured_output.record_output("DMAS", "text", usage)
+    toks = usage["total_tokens"]
+    # one line per agent reply; the ledger already keeps every call's tokens
+    log.debug("tokens this call: %d (prompt %d, completion %d)",
+              toks, usage["prompt_tokens"], usage["completion_tokens"])
+    return text, toks
 def apply_action(reply, boxes):
 
     parts = reply.split()
@@ -149,44 +156,104 @@ def apply_action(reply, boxes):
         print(f"Box {box.color} is now at {box.positions}")
 
 def parse_action(text: str):
-    text = text.strip()
+    """First action in an agent's reply, or (-1, "none", None, "stay")."""
+    for act in plan_parser.parse_plan(text):
+        return act
+    return plan_parser.Action(-1, "none", None, "stay")
 
-    # move …
-    if m := _MOVE_PAT.match(text):
-        aid, col, r1, c1, _, _, dir_raw = m.groups()
-        direction = (dir_raw or "stay").lower()
-        return int(aid), col.lower(), (int(r1), int(c1)), direction
+def _agent_cells(agent):
+    """BoxNet1 agents hold one (row, col); BoxNet2 agents hold a list of cells."""
+    pos = agent.position
+    if isinstance(pos, tuple) and all(isinstance(v, int) for v in pos):
+        return {pos}
+    return {tuple(p) for p in pos}
 
-    # move to goal …
-    if m := _GOAL_PAT.match(text):
-        aid, col = m.groups()
-        return int(aid), col.lower(), None, "goal"
+def agent_adjacency(env):
+    """
+    Neighbour sets per agent id. Single‑cell agents (BoxNet1, one per grid
+    cell) neighbour the agents in the 4 adjacent cells; multi‑cell agents
+    (BoxNet2) neighbour every agent whose cells overlap theirs.
+    """
+    cells = [_agent_cells(a) for a in env.agents]
+    adj = {aid: set() for aid in range(len(cells))}
+    for a in range(len(cells)):
+        for b in range(a + 1, len(cells)):
+            if len(cells[a]) == 1 and len(cells[b]) == 1:
+                (r1, c1), (r2, c2) = next(iter(cells[a])), next(iter(cells[b]))
+                linked = abs(r1 - r2) + abs(c1 - c2) == 1
+            else:
+                linked = bool(cells[a] & cells[b])
+            if linked:
+                adj[a].add(b)
+                adj[b].add(a)
+    return adj
 
-    # do nothing …
-    if m := _NONE_PAT.match(text):
-        return int(m.group(1)), "none", None, "stay"
+def color_agents(adj):
+    """Greedy (Welsh–Powell) colouring; returns the colour classes in order."""
+    color = {}
+    for aid in sorted(adj, key=lambda a: (-len(adj[a]), a)):
+        taken = {color[n] for n in adj[aid] if n in color}
+        color[aid] = next(c for c in range(len(adj)) if c not in taken)
+    classes = [[] for _ in range(max(color.values(), default=-1) + 1)]
+    for aid in sorted(color):
+        classes[color[aid]].append(aid)
+    return classes
 
-    # fallback
-    return -1, "none", None, "stay"
+def dmas_plan(env, boxes, goals, schedule="sequential", concurrency=None,
+              window=HISTORY_WINDOW, digest=False, detectors=(), max_rounds=3,
+              structured=False):
+    """
+    Run up to *max_rounds* rounds of agent dialogue.
 
-def dmas_plan(env, boxes, goals):
-    global turn_history, tokens_used
-    turn_history = []
+    schedule="sequential" – one agent at a time.
+    schedule="wavefront"  – agents are coloured so no two neighbours share a
+                            colour, and each colour class queries concurrently.
+    Either way an agent only sees its neighbours' last *window* replies
+    (see DialogueHistory); tokens are summed over every call.
+    After each round the named convergence *detectors* may end the dialogue;
+    the returned stop reason is the detector's name or "max_rounds".
+    With *structured* the agents answer in the JSON schema of structured_output.
+    """
+    adj = agent_adjacency(env)
+    history = DialogueHistory(adj, window, digest)
+    if schedule == "wavefront":
+        waves = color_agents(adj)
+    else:
+        waves = [[aid] for aid in range(len(env.agents))]
 
     actions   = []
     api_calls = 0
+    tokens_used = 0
+    stop_reason = "max_rounds"
+    prev_round = None
+
+    for round_num in range(max_rounds):
+        with tracing.span(f"round {round_num}", "round", schedule=schedule), ledger.tagged(round=round_num):
+            round_start = len(actions)
+            for group in waves:
+                # agents in one wave are never neighbours, so they share a snapshot
+                def ask(aid):
+                    with tracing.span(f"agent {aid}", "agent"), ledger.tagged(agent=aid):
+                        prompt = build_prompt(env, aid, boxes, goals, history.view(aid))
+                        print(prompt)
+                        return query_llm(prompt, env, structured)
+
+                for aid, (reply, toks) in zip(group, llm.map_concurrent(ask, group, concurrency)):
+                    reply = reply.strip()
+                    actions.append(parse_action(reply))
+                    history.record(aid, reply)
+                    tokens_used += toks
+                    api_calls += 1
+
+            this_round = convergence.latest_per_agent(actions[round_start:])
+            plan = [a for a in convergence.latest_per_agent(actions).values()
+                    if a[0] >= 0 and a[3] != "stay"]
+            state = convergence.RoundState(round_num, this_round, prev_round, plan, env)
+            reason = convergence.first_stop(detectors, state)
+            if reason:
+                tracing.annotate(stop=reason)
+                stop_reason = reason
+                break
+            prev_round = this_round
 
-    # three rounds of dialogue
-    for _ in range(3):
-        for aid in range(NUM_AGENTS):
-            prompt = build_prompt(env, aid, boxes, goals, turn_history)
-            print(prompt)
-            reply, tokens_used = query_llm(prompt)
-            reply = reply.strip()
-            act_tuple = parse_action(reply)
-            actions.append(act_tuple)
-            api_calls += 1
-            turn_history.append(reply)
-
-    # return either 2‑ or 3‑tuple
-    return actions, api_calls, tokens_used  # tokens are logged in batch tester
+    return actions, api_calls, tokens_used, stop_reason  # tokens are logged in batch tester
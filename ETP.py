@@ -1,16 +1,15 @@
-from openai import OpenAI
 import json
-import re
-import os
-from dotenv import load_dotenv
+import logging
 import BoxNet1
 import BoxNet2_test
-import time
+import executor
+import latency
+import llm
+import plan_parser
+import structured_output
 
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
+@latency.timed("prompt")
 def intialPlan(env):
     if (isinstance(env, BoxNet1.BoxNet1)):
         lines = [
@@ -76,83 +75,49 @@ def intialPlan(env):
 
     return "\n".join(lines)
 
-def call_llm(prompt):
-    response = client.chat.completions.create(
-        model="gpt-4",  # or "gpt-3.5-turbo"
-        messages=[{"role": "system", "content": "You are a helpful robot task planner."},
-                  {"role": "user", "content": prompt}],
-        temperature=0
-    )
-    total_tokens = response.usage.total_tokens
+MODEL = "gpt-4"  # or "gpt-3.5-turbo"
+
+def _messages(prompt):
+    return [{"role": "system", "content": "You are a helpful robot task planner."},
+            {"role": "user", "content": prompt}]
+
+def call_llm(prompt, env=None, structured=False):
+    if structured:
+        text, usage, _ = structured_output.complete_plan(
+            _messages(prompt), env, MODEL, "ETP", temperature=0)
+    else:
+        text, usage = llm.complete(_messages(prompt), model=MODEL, temperature=0)
+        structured_output.record_output("ETP", "text", usage)
+    total_tokens = usage["total_tokens"]
     print(f"Total tokens used: {total_tokens}")
-    return response.choices[0].message.content
+    return text, total_tokens
+
+def stream_plan(env, prompt):
+    """
+    Stream the plan, validating every action on a scratch copy of *env*;
+    generation stops at the first invalid one.
+    Returns (text, total_tokens, actions, failed_at).
+    """
+    text, usage, actions, failed_at = executor.stream_validated_plan(
+        _messages(prompt), env, MODEL, temperature=0)
+    note = f", aborted at action {failed_at}" if failed_at is not None else ""
+    print(f"Total tokens used: {usage['total_tokens']}{note}")
+    return text, usage["total_tokens"], actions, failed_at
+
+
 def parse_llm_plan(text):
-    actions = []
-
-    pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)\]?)?"
-    pattern_nothing = r".*?Agent (\d+): do nothing"
-    pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
-
-    for line in text.strip().split('\n'):
-        move_match = re.match(pattern_move, line.strip())
-        nothing_match = re.match(pattern_nothing, line.strip())
-        move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
-
-        if move_match:
-            agent_id = int(move_match.group(1))
-            color = move_match.group(2)
-            from_pos = (int(move_match.group(3)), int(move_match.group(4)))
-            to_pos = (int(move_match.group(5)), int(move_match.group(6)))
-
-            direction = move_match.group(7)
-            actions.append((agent_id, color, from_pos, direction))
-        
-        elif nothing_match:
-            agent_id = int(nothing_match.group(1))
-            actions.append((agent_id, "none", None, "stay"))
-        elif move_to_goal_match:
-            agent_id = int(move_to_goal_match.group(1))
-            color = move_to_goal_match.group(2)
-            actions.append((agent_id, color, None, "goal"))
-
-    return actions
-
-def execute_plan(env, actions):
-    for agent_id, color, from_pos, direction in actions:
-        if color == "none":
-            print(f"Agent {agent_id} does nothing")
-            continue
-        if direction == "goal":
-            env.move_to_goal(color)
-            continue
-        # Find the box object by color and current position
-        box = next(
-            (b for b in env.boxes if b.color == color and from_pos in b.positions),
-            None
-        )
-
-        if box:
-            success = env.move_box(box, from_pos, direction)
-            status = "✅ Success" if success else "❌ Failed"
-            print(f"{status}: Agent {agent_id} moved {color} box from {from_pos} {direction}")
-            if not success:
-                return False
-        else:
-            print(f"⚠️ Agent {agent_id} could not find {color} box at {from_pos}")
-            return False
-        
-        time.sleep(1) # For debugging
-    print("\n🧱 Final Environment State:")
-    print(env.goals)
-    for box in env.boxes:
-        print(f"{box.color} box positions: {box.positions}")
-    
-    return True
-
-def runETP():
+    return plan_parser.parse_plan(text)
+
+def execute_plan(env, actions, pace=0.0):
+    """Run the plan, stopping at the first failing action; True if all succeeded."""
+    return executor.execute_plan(env, actions, pace=pace).ok
+
+def runETP(stream=False):
     env = BoxNet1.BoxNet1()
+    if stream:
+        return _runETP_streaming(env)
     prompt = intialPlan(env)
-    response = call_llm(prompt)
+    response, _ = call_llm(prompt)
     actions = parse_llm_plan(response)
     iteration = 0
     while (not execute_plan(env, actions) and iteration < 5):
@@ -160,10 +125,21 @@ def runETP():
         for box in env.boxes:
             print(f"{box.color} box positions: {box.positions}")
         prompt = intialPlan(env)
-        response = call_llm(prompt)
+        response, _ = call_llm(prompt)
         actions = parse_llm_plan(response)
         iteration += 1
-    
+
+def _runETP_streaming(env, max_iterations=5):
+    """Replan as soon as a streamed action is invalid, keeping the valid prefix."""
+    for iteration in range(max_iterations + 1):
+        prompt = intialPlan(env)
+        _, _, actions, failed_at = stream_plan(env, prompt)
+        if failed_at is None:
+            return execute_plan(env, actions)
+        execute_plan(env, actions[:failed_at])
+    return False
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     runETP()
     
\ No newline at end of file
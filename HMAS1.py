@@ -1,21 +1,27 @@
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import BoxNet1
 import BoxNet2_test
-import time
-import re
-
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import executor
+import latency
+import ledger
+import tracing
+import llm
+import plan_parser
+import structured_output
+import threading
 
 class HMAS1:
-    def __init__(self, environment_type="boxnet1"):
+    def __init__(self, environment_type="boxnet1", concurrency=None, structured=False):
         self.token_count = 0
         self.environment_type = environment_type
         self.env = BoxNet1.BoxNet1() if environment_type == "boxnet1" else BoxNet2_test.BoxNet2()
         self.turn_history = []
+        # max simultaneous local-agent reviews (1 = sequential, None = llm default)
+        self.concurrency = concurrency
+        self._token_lock = threading.Lock()
+        # ask for JSON-schema plans instead of free text (see structured_output)
+        self.structured = structured
+    @latency.timed("prompt")
     def format_central_prompt(self, env):
         """Format prompt for centralized CMAS planner."""
         if isinstance(env, BoxNet1.BoxNet1):
@@ -129,30 +135,8 @@ class HMAS1:
 
         return "\n".join(lines)
     def parse_llm_plan(self, text):
-        actions = []
-        pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)]?)?"
-        pattern_nothing = r".*?Agent (\d+): do nothing"
-        pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
-
-        for line in text.strip().split('\n'):
-            move_match = re.match(pattern_move, line.strip())
-            nothing_match = re.match(pattern_nothing, line.strip())
-            move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
-
-            if move_match:
-                agent_id = int(move_match.group(1))
-                color = move_match.group(2)
-                from_pos = (int(move_match.group(3)), int(move_match.group(4)))
-                direction = move_match.group(7)
-                actions.append((agent_id, color, from_pos, direction))
-            elif nothing_match:
-                agent_id = int(nothing_match.group(1))
-                actions.append((agent_id, "none", None, "stay"))
-            elif move_to_goal_match:
-                agent_id = int(move_to_goal_match.group(1))
-                color = move_to_goal_match.group(2)
-                actions.append((agent_id, color, None, "goal"))
-        return actions
+        return plan_parser.parse_plan(text)
+    @latency.timed("prompt")
     def format_local_prompt(self, agent_id, agent, central_plan):
         lines = [
         "You are a local LLM agent responsible for checking and revising your assigned action.",
@@ -165,52 +149,46 @@ class HMAS1:
         return "\n".join(lines)
 
     def call_llm(self, prompt):
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "You are a helpful agent."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-        self.token_count += response.usage.total_tokens
-        return response.choices[0].message.content, self.token_count
-
-    def execute_plan(self, env, actions):
-        for agent_id, color, from_pos, direction in actions:
-            if color == "none":
-                print(f"Agent {agent_id} does nothing")
-                continue
-            if direction == "goal":
-                env.move_to_goal(color)
-                continue
-            box = next((b for b in env.boxes if b.color == color and from_pos in b.positions), None)
-            if box:
-                success = env.move_box(box, from_pos, direction)
-                print(f"{'✅ Success' if success else '❌ Failed'}: Agent {agent_id} moved {color} box from {from_pos} {direction}")
-            else:
-                print(f"⚠️ Agent {agent_id} could not find {color} box at {from_pos}")
-            time.sleep(1)
-        print("\n🧱 Final Environment State:")
-        print(self.env.goals)
-        for box in self.env.boxes:
-            print(f"{box.color} box positions: {box.positions}")
+        messages = [
+            {"role": "system", "content": "You are a helpful agent."},
+            {"role": "user", "content": prompt}
+        ]
+        if self.structured:
+            text, usage, _ = structured_output.complete_plan(messages, self.env, "gpt-4.1", "HMAS-1", temperature=0)
+        else:
+            text, usage = llm.complete(messages, model="gpt-4.1", temperature=0)
+            structured_output.record_output("HMAS-1", "text", usage)
+        with self._token_lock:
+            self.token_count += usage["total_tokens"]
+            return text, self.token_count
+
+    def execute_plan(self, env, actions, pace=0.0):
+        """Run every action, recording failures instead of stopping (see executor)."""
+        return executor.execute_plan(env, actions, pace=pace, stop_on_failure=False)
 
+    @tracing.traced("HMAS-1", "planner")
     def runHMAS1(self):
         api_calls = 1
         print("\n== Central Planner Proposing Initial Plan ==")
-        initial_prompt = self.format_central_prompt(self.env)
-        central_plan, _ = self.call_llm(initial_prompt)
+        with tracing.span("central plan", "round"), ledger.tagged(round=0, agent="central"):
+            initial_prompt = self.format_central_prompt(self.env)
+            central_plan, _ = self.call_llm(initial_prompt)
         print(central_plan)
 
         print("\n== Local Agents Checking and Revising Plan ==")
-        local_action_strs = []
-        for id, agent in enumerate(self.env.agents):
-            agent_prompt = self.format_local_prompt(id, agent, central_plan)
-            response, tokens = self.call_llm(agent_prompt)
-            api_calls += 1
+        # each review depends only on the central plan, so they can run at once
+        def review(indexed_agent):
+            id, agent = indexed_agent
+            with tracing.span(f"agent {id}", "agent"), ledger.tagged(agent=id):
+                agent_prompt = self.format_local_prompt(id, agent, central_plan)
+                response, _ = self.call_llm(agent_prompt)
+                return response
+
+        with tracing.span("local review", "round"), ledger.tagged(round=1):
+            local_action_strs = llm.map_concurrent(review, enumerate(self.env.agents), self.concurrency)
+        api_calls += len(local_action_strs)
+        for id, response in enumerate(local_action_strs):
             print(f"Agent {id} Response:\n{response}\n")
-            local_action_strs.append(response)
 
         final_plan = "\n".join(local_action_strs)
         actions = self.parse_llm_plan(final_plan)
@@ -1,27 +1,39 @@
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
 import BoxNet1
 from HMAS1 import HMAS1
 import BoxNet2_test
-import time
+import executor
+import latency
+import ledger
+import tracing
+import convergence
+import llm
+import plan_parser
+import structured_output
+import threading
 import re
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 class HMAS2:
-    def __init__(self, environment_type="boxnet1"):
+    def __init__(self, environment_type="boxnet1", concurrency=None, detectors=(), structured=False):
         self.token_count = 0
         self.environment_type = environment_type
         self.env = BoxNet1.BoxNet1() if environment_type == "boxnet1" else BoxNet2_test.BoxNet2()
+        # max simultaneous feedback calls (1 = sequential, None = llm default)
+        self.concurrency = concurrency
+        self._token_lock = threading.Lock()
+        # convergence detector names checked on the central plan each round
+        self.detectors = detectors
+        # central plans come back as JSON-schema plans (see structured_output)
+        self.structured = structured
+        self.stop_reason = None
 
+    @latency.timed("prompt")
     def format_central_prompt(self):
         # Use the same logic from your HMAS1 to format the initial plan prompt
         hmas1 = HMAS1(self.environment_type)
         return hmas1.format_central_prompt(hmas1.env)
 
+    @latency.timed("prompt")
     def format_feedback_prompt(self, agent_id, agent, action):
         lines = [
             f"You are Agent {agent_id}. Your job is to review your assigned action:",
@@ -32,96 +44,95 @@ class HMAS2:
         ]
         return "\n".join(lines)
 
-    def call_llm(self, prompt):
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "You are a helpful planner."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-        self.token_count += response.usage.total_tokens
-        return response.choices[0].message.content.strip(), self.token_count
+    def call_llm(self, prompt, plan=False):
+        """*plan* marks central-plan calls, which use structured mode if enabled."""
+        messages = [
+            {"role": "system", "content": "You are a helpful planner."},
+            {"role": "user", "content": prompt}
+        ]
+        if plan and self.structured:
+            text, usage, _ = structured_output.complete_plan(messages, self.env, "gpt-4.1", "HMAS-2", temperature=0)
+        else:
+            text, usage = llm.complete(messages, model="gpt-4.1", temperature=0)
+            if plan:
+                structured_output.record_output("HMAS-2", "text", usage)
+        with self._token_lock:
+            self.token_count += usage["total_tokens"]
+            return text.strip(), self.token_count
 
     def parse_llm_plan(self, text):
-        actions = []
-        pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)]?)?"
-        pattern_nothing = r".*?Agent (\d+): do nothing"
-        pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
-
-        for line in text.strip().split('\n'):
-            move_match = re.match(pattern_move, line.strip())
-            nothing_match = re.match(pattern_nothing, line.strip())
-            move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
-
-            if move_match:
-                agent_id = int(move_match.group(1))
-                color = move_match.group(2)
-                from_pos = (int(move_match.group(3)), int(move_match.group(4)))
-                direction = move_match.group(7)
-                actions.append((agent_id, color, from_pos, direction))
-            elif nothing_match:
-                agent_id = int(nothing_match.group(1))
-                actions.append((agent_id, "none", None, "stay"))
-            elif move_to_goal_match:
-                agent_id = int(move_to_goal_match.group(1))
-                color = move_to_goal_match.group(2)
-                actions.append((agent_id, color, None, "goal"))
-        return actions
-
-    def execute_plan(self, env, actions):
-        for agent_id, color, from_pos, direction in actions:
-            if color == "none":
-                print(f"Agent {agent_id} does nothing")
-                continue
-            if direction == "goal":
-                env.move_to_goal(color)
-                continue
-            box = next((b for b in env.boxes if b.color == color and from_pos in b.positions), None)
-            if box:
-                success = env.move_box(box, from_pos, direction)
-                print(f"{'✅ Success' if success else '❌ Failed'}: Agent {agent_id} moved {color} box from {from_pos} {direction}")
-            else:
-                print(f"⚠️ Agent {agent_id} could not find {color} box at {from_pos}")
-            time.sleep(0.5)
-        print("\n🧱 Final Environment State:")
-        print(self.env.goals)
-        for box in env.boxes:
-            print(f"{box.color} box positions: {box.positions}")
+        return plan_parser.parse_plan(text)
+
+    def execute_plan(self, env, actions, pace=0.0):
+        """Run every action, recording failures instead of stopping (see executor)."""
+        return executor.execute_plan(env, actions, pace=pace, stop_on_failure=False)
 
+    @tracing.traced("HMAS-2", "planner")
     def runHMAS2(self):
         print("\n== Central Planner Proposing Initial Plan ==")
-        central_prompt = self.format_central_prompt()
         api_calls = 1
-        central_plan, _ = self.call_llm(central_prompt)
+        with tracing.span("central plan", "round"), ledger.tagged(round=0, agent="central"):
+            central_prompt = self.format_central_prompt()
+            central_plan, _ = self.call_llm(central_prompt, plan=True)
         print(central_plan)
 
         consensus_reached = False
+        self.stop_reason = "max_rounds"
+        last_lines = {}      # agent id -> action line it was last asked about
+        last_feedback = {}   # agent id -> feedback it gave on that line
+        prev_actions = None
         for round_num in range(5):
-            print(f"\n== Feedback Round {round_num+1} ==")
-            agent_feedback = []
-
-            for id, agent in enumerate(self.env.agents):
-                # Get just this agent's action line
-                pattern = rf"Agent {id}:.*"
-                match = re.search(pattern, central_plan)
-                action_line = match.group(0) if match else "do nothing"
-                
-                prompt = self.format_feedback_prompt(id, agent, action_line)
-                api_calls += 1
-                feedback, _ = self.call_llm(prompt)
-                print(f"Agent {id} Feedback: {feedback}")
-                agent_feedback.append((id, feedback.strip()))
-
-            if all(fb == "agree" for _, fb in agent_feedback):
-                consensus_reached = True
-                break
-            else:
-                feedback_summary = "\n".join([f"Agent {id}: {fb}" for id, fb in agent_feedback])
-                central_prompt += f"\n\nAgents provided feedback on the plan:\n{feedback_summary}\nPlease revise the plan."
-                central_plan, _ = self.call_llm(central_prompt)
-                #print("\n🔁 Revised Plan:\n", central_plan)
+            with tracing.span(f"round {round_num}", "round"), ledger.tagged(round=round_num + 1):
+                plan_actions = self.parse_llm_plan(central_plan)
+                round_actions = convergence.latest_per_agent(plan_actions)
+                state = convergence.RoundState(round_num, round_actions, prev_actions, plan_actions, self.env)
+                reason = convergence.first_stop(self.detectors, state)
+                if reason:
+                    print(f"\n== Stopping before round {round_num+1}: {reason} ==")
+                    tracing.annotate(stop=reason)
+                    self.stop_reason = reason
+                    break
+                prev_actions = round_actions
+
+                print(f"\n== Feedback Round {round_num+1} ==")
+
+                action_lines = {}
+                for id, agent in enumerate(self.env.agents):
+                    # Get just this agent's action line
+                    pattern = rf"Agent {id}:.*"
+                    match = re.search(pattern, central_plan)
+                    action_lines[id] = match.group(0) if match else "do nothing"
+
+                # an agent that already agreed to an unchanged line is not asked again
+                to_ask = [id for id in action_lines
+                          if not (last_feedback.get(id) == "agree" and last_lines.get(id) == action_lines[id])]
+
+                def ask(id):
+                    with tracing.span(f"agent {id}", "agent"), ledger.tagged(agent=id):
+                        prompt = self.format_feedback_prompt(id, self.env.agents[id], action_lines[id])
+                        feedback, _ = self.call_llm(prompt)
+                        return feedback.strip()
+
+                for id, feedback in zip(to_ask, llm.map_concurrent(ask, to_ask, self.concurrency)):
+                    last_lines[id] = action_lines[id]
+                    last_feedback[id] = feedback
+                api_calls += len(to_ask)
+
+                agent_feedback = [(id, last_feedback[id]) for id in action_lines]
+                for id, fb in agent_feedback:
+                    print(f"Agent {id} Feedback: {fb}{'' if id in to_ask else ' (unchanged)'}")
+
+                if all(fb == "agree" for _, fb in agent_feedback):
+                    consensus_reached = True
+                    self.stop_reason = "consensus"
+                    break
+                else:
+                    feedback_summary = "\n".join([f"Agent {id}: {fb}" for id, fb in agent_feedback])
+                    central_prompt += f"\n\nAgents provided feedback on the plan:\n{feedback_summary}\nPlease revise the plan."
+                    api_calls += 1
+                    with tracing.span("revise plan", "agent"), ledger.tagged(agent="central"):
+                        central_plan, _ = self.call_llm(central_prompt, plan=True)
+                    #print("\n🔁 Revised Plan:\n", central_plan)
         return central_plan, api_calls
         #final_actions = self.parse_llm_plan(central_plan)
         #self.execute_plan(self.env, final_actions)
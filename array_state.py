@@ -0,0 +1,140 @@
+"""
+NumPy array view of a BoxNet1 / BoxNet2 env, for checking and scoring
+many actions at once.
+
+•  `ArrayState.from_env(env)` – `occ[color, row, col]` counts box positions,
+   `goal[color, row, col]` is the goal mask, `cleared[color]` marks
+   BoxNet2 colours already moved to their goal
+•  `encode(actions)` – (color, row, col, op) int rows; op 0–3 is a move
+   (up, down, left, right), GOAL, NONE or BAD
+•  `check(actions)` – vectorised bounds / occupancy check of every action
+   against the current state, as executor.apply_action would judge it
+•  `apply(actions)` – one simultaneous step: valid actions move, and when
+   more actions take a colour from a cell than it has boxes, the later
+   ones fail. For actions on distinct boxes (one planning round) this is
+   the same as executing them in order
+•  `success_pct()` – one reduction, same numbers as batch_testing.success_pct
+•  `to_env()` – the object model back: the env it was built from with every
+   applied move replayed through `move_box`, so box order, position order
+   and goal lists are exactly what sequential execution gives
+
+A goal action for a colour the env does not have is rejected here; the
+object model would add an empty goal list for it.
+"""
+
+import copy
+
+import numpy as np
+
+import executor
+
+DR = np.array([-1, 1, 0, 0])
+DC = np.array([0, 0, -1, 1])
+GOAL, NONE, BAD = 4, 5, 6
+OPS = {d: i for i, d in enumerate(executor.DIRECTIONS)}
+OPS.update(goal=GOAL, stay=NONE)
+
+
+def _rank(keys):
+    """For each element, how many earlier elements share its key."""
+    order = np.argsort(keys, kind="stable")
+    ordered = keys[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    rank = np.empty(len(keys), dtype=np.int64)
+    rank[order] = np.arange(len(keys)) - np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+    return rank
+
+
+class ArrayState:
+    def __init__(self, env):
+        self.base = copy.deepcopy(env)
+        self.boxnet2 = hasattr(env, "move_to_goal")
+        self.rows, self.cols = executor.grid_shape(env)
+        self.colors = list(env.goals) + [c for c in dict.fromkeys(b.color for b in env.boxes)
+                                         if c not in env.goals]
+        self.color_index = {c: i for i, c in enumerate(self.colors)}
+        shape = (len(self.colors), self.rows, self.cols)
+        self.occ = np.zeros(shape, dtype=np.int32)
+        self.goal = np.zeros(shape, dtype=bool)
+        self.has_goals = np.array([c in env.goals for c in self.colors], dtype=bool)
+        self.cleared = np.array([c in env.goals and not env.goals[c] for c in self.colors], dtype=bool)
+        for box in env.boxes:
+            for r, c in box.positions:
+                self.occ[self.color_index[box.color], r, c] += 1
+        for color, cells in env.goals.items():
+            for r, c in cells:
+                self.goal[self.color_index[color], r, c] = True
+        self.moves = []          # applied actions, replayed by to_env
+
+    @classmethod
+    def from_env(cls, env):
+        return cls(env)
+
+    def encode(self, actions):
+        """int32 array [N, 4] of (color index or -1, row or -1, col or -1, op)."""
+        out = np.full((len(actions), 4), -1, dtype=np.int32)
+        for i, (_, color, from_pos, direction) in enumerate(actions):
+            out[i, 0] = self.color_index.get(color, -1)
+            if from_pos is not None:
+                out[i, 1], out[i, 2] = from_pos
+            out[i, 3] = NONE if color == "none" else OPS.get(direction, BAD)
+        return out
+
+    def check(self, actions):
+        """Boolean mask: which actions are valid on the current state, each on its own."""
+        a = actions if isinstance(actions, np.ndarray) else self.encode(actions)
+        c, r, col, op = a.T
+        move = op < 4
+        d = np.where(move, op, 0)
+        nr, nc = r + DR[d], col + DC[d]
+        inside = ((r >= 0) & (r < self.rows) & (col >= 0) & (col < self.cols)
+                  & (nr >= 0) & (nr < self.rows) & (nc >= 0) & (nc < self.cols))
+        sel = move & inside & (c >= 0)
+        has_box = np.zeros(len(a), dtype=bool)
+        has_box[sel] = self.occ[c[sel], r[sel], col[sel]] > 0
+        return (sel & has_box) | (op == NONE) | ((op == GOAL) & (c >= 0) & self.boxnet2)
+
+    def apply(self, actions):
+        """Apply *actions* as one step; returns the mask of actions that took effect."""
+        a = self.encode(actions)
+        ok = self.check(a)
+        c, r, col, op = a.T
+        mv = np.flatnonzero(ok & (op < 4))
+        dst = np.zeros(0, dtype=np.int64)
+        if len(mv):
+            # the k‑th move out of a (colour, cell) needs k + 1 boxes there
+            src = np.ravel_multi_index((c[mv], r[mv], col[mv]), self.occ.shape)
+            enough = _rank(src) < self.occ.reshape(-1)[src]
+            ok[mv[~enough]] = False
+            mv, src = mv[enough], src[enough]
+            d = op[mv]
+            dst = np.ravel_multi_index((c[mv], r[mv] + DR[d], col[mv] + DC[d]), self.occ.shape)
+            flat = self.occ.reshape(-1)
+            np.subtract.at(flat, src, 1)
+            np.add.at(flat, dst, 1)
+        if self.boxnet2:
+            # a colour is cleared by the goal action or by a box landing on a goal corner
+            done = np.zeros(len(self.colors), dtype=bool)
+            done[c[ok & (op == GOAL)]] = True
+            done[np.unravel_index(dst[self.goal.reshape(-1)[dst]], self.occ.shape)[0]] = True
+            self.occ[done] = 0
+            self.goal[done] = False
+            self.has_goals |= done
+            self.cleared |= done
+        self.moves.extend(act for act, good in zip(actions, ok) if good)
+        return ok
+
+    def success_pct(self):
+        """Boxes on goals (BoxNet1) or colours cleared (BoxNet2), in percent."""
+        if self.boxnet2:
+            total = self.has_goals.sum()
+            return 100.0 * self.cleared[self.has_goals].sum() / total if total else 0.0
+        total = self.goal.sum()
+        return 100.0 * (self.goal & (self.occ > 0)).sum() / total if total else 0.0
+
+    def to_env(self):
+        """The object‑model env for the current state."""
+        env = copy.deepcopy(self.base)
+        for act in self.moves:
+            executor.apply_action(env, act)
+        return env
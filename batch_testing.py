@@ -9,34 +9,54 @@ on BoxNet1 & BoxNet2 (5 frameworks × 2 envs).
 •  DMAS wrapper now:
      – deduplicates actions (keeps most‑recent per agent)
      – supports optional token return from DMAS
+•  wrappers return (plan, tokens, api_calls[, extra‑columns dict]);
+   DMAS / HMAS‑2 report why their dialogue loop stopped
+•  plans run on the headless executor (no pacing); first_failure is the
+   index of the first action that could not be executed
+•  tokens come from the ledger (prompt / completion per call, priced);
+   cost per framework and per successful trial in cost_<run>.csv
+•  per‑trial seconds in prompt build / LLM (time to first byte and total) /
+   parse / execute, p50/p95/p99 per framework, optional per‑call JSONL trace
+•  --record saves every prompt / reply of the run to a cassette; --replay
+   reruns a cassette's trials offline and flags prompts that changed
+•  pandas / matplotlib / tqdm load only where they are used; --no-plots
+   writes the raw files without ever importing pandas or matplotlib
+•  --scenario-set swaps the two fixed boards for generated rows × cols
+   instances (scenarios.py), one seeded board per trial
 """
 
-import os, csv, argparse, traceback, json, re
+import os, csv, argparse, traceback, json, logging
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from typing import List
 
-import pandas as pd
-import matplotlib.pyplot as plt
-from tqdm import tqdm
-
 # ────────────────────────────────────────────────────────────
 #  Environments
 # ────────────────────────────────────────────────────────────
 from BoxNet1 import BoxNet1
 from BoxNet2_test import BoxNet2
+import scenarios
 
 # ────────────────────────────────────────────────────────────
 #  Frameworks
 # ────────────────────────────────────────────────────────────
 import CMAS, DMAS, HMAS1, HMAS2, ETP
+import cassette
+import executor
+import latency
+import ledger
+import llm
+import llm_cache
+import ratelimit
+import structured_output
+import tracing
+from convergence import DETECTORS
+from plan_parser import parse_line
 
 # ────────────────────────────────────────────────────────────
 #  Generic parsing / execution utilities
 # ────────────────────────────────────────────────────────────
-_MOVE_RE  = re.compile(r"move (\w+) box from \((\d+),\s*(\d+)\).*?(\bup|\bdown|\bleft|\bright)", re.I)
-_GOAL_RE  = re.compile(r"move (\w+) box to goal", re.I)
-_NOTH_RE  = re.compile(r"do\s+nothing", re.I)
-
 def _to_lines(obj) -> List[str]:
     if obj is None: return []
     if isinstance(obj, dict):
@@ -52,31 +72,14 @@ def _to_lines(obj) -> List[str]:
     return str(obj).splitlines()
 
 def _parse_generic(lines: List[str]):
-    actions = []
-    for ln in lines:
-        ln = ln.strip()
-        if not ln: continue
-        m_id = re.match(r"Agent\s*(\d+)\s*:?", ln, re.I)
-        aid = int(m_id.group(1)) if m_id else 0
-
-        if m := _MOVE_RE.search(ln):
-            color = m.group(1)
-            pos   = (int(m.group(2)), int(m.group(3)))
-            direc = m.group(4)
-            actions.append((aid, color, pos, direc))
-
-        elif m := _GOAL_RE.search(ln):
-            actions.append((aid, m.group(1), None, "goal"))
-
-        elif _NOTH_RE.search(ln):
-            actions.append((aid, "none", None, "stay"))
-
+    # lines without an "Agent N" prefix are attributed to agent 0
+    actions = [a for a in (parse_line(ln, default_agent=0) for ln in lines) if a]
     return actions or None
 
 def _exec_plan(env, plan_like):
     """
     Execute a plan on *env* (plan_like may be a text blob,
-    json, dict, or DMAS’s list‑of‑tuples).
+    json, dict, or DMAS’s list‑of‑tuples); returns executor.ExecResult.
     """
     # DMAS already returns list[tuple]
     if isinstance(plan_like, list) and plan_like and len(plan_like[0]) == 4:
@@ -88,30 +91,41 @@ def _exec_plan(env, plan_like):
             dummy = HMAS1.HMAS1("boxnet1")
             acts  = HMAS1.HMAS1.parse_llm_plan(dummy, str(plan_like))
 
-    # use HMAS1’s motion executor (it mutates env)
-    dummy = HMAS1.HMAS1("boxnet1")
-    HMAS1.HMAS1.execute_plan(dummy, env, acts)
+    # headless, unpaced; keeps going past failures and records each one
+    return executor.execute_plan(env, acts or [], stop_on_failure=False)
 
 # ────────────────────────────────────────────────────────────
 #  Wrappers (one per framework)
 # ────────────────────────────────────────────────────────────
-def wrap_cmas(env):
+def wrap_cmas(env, stream=False, structured=False):
     prompt        = CMAS.format_prompt(env)
-    plan, tokens  = CMAS.call_llm(prompt)
-    _exec_plan(env, plan)
-    return plan, tokens, 1
-
-def wrap_dmas(env):
+    if stream and not structured:
+        # generation is cut at the first invalid action; run the valid prefix
+        plan, tokens, acts, failed_at = CMAS.stream_plan(env, prompt)
+        _exec_plan(env, acts[:failed_at])
+        return plan, tokens, 1, {"first_failure": failed_at}
+    plan, tokens  = CMAS.call_llm(prompt, env, structured)
+    res = _exec_plan(env, plan)
+    return plan, tokens, 1, {"first_failure": res.first_failure}
+
+def wrap_dmas(env, schedule="sequential", window=DMAS.HISTORY_WINDOW, digest=False,
+              detectors=(), structured=False):
     """
-    Accepts 2‑tuple (actions, api_calls) or
-             3‑tuple (actions, api_calls, tokens)
+    Accepts 2‑tuple (actions, api_calls),
+             3‑tuple (actions, api_calls, tokens) or
+             4‑tuple (actions, api_calls, tokens, stop_reason)
     from DMAS.dmas_plan.
     Deduplicates actions (keeps most‑recent per agent).
     Filters out any “stay”/“none” actions before execution.
     """
-    result = DMAS.dmas_plan(env, env.boxes, env.goals)
-
-    if len(result) == 3:
+    result = DMAS.dmas_plan(env, env.boxes, env.goals, schedule=schedule,
+                            window=window, digest=digest, detectors=detectors,
+                            structured=structured)
+
+    stop_reason = ""
+    if len(result) == 4:
+        actions, api_calls, tokens, stop_reason = result
+    elif len(result) == 3:
         actions, api_calls, tokens = result
     else:
         actions, api_calls = result
@@ -132,20 +146,21 @@ def wrap_dmas(env):
     ]
 
     # now execute only the real moves/goals
-    _exec_plan(env, exec_actions)
-    return unique_actions, tokens, api_calls
+    res = _exec_plan(env, exec_actions)
+    return unique_actions, tokens, api_calls, {"stop_reason": stop_reason,
+                                               "first_failure": res.first_failure}
 
-def wrap_hmas1(env):
+def wrap_hmas1(env, structured=False):
     etype = "boxnet2" if isinstance(env, BoxNet2) else "boxnet1"
-    agent = HMAS1.HMAS1(environment_type=etype)
+    agent = HMAS1.HMAS1(environment_type=etype, structured=structured)
     agent.env = env
     plan, api_calls = agent.runHMAS1()
-    _exec_plan(env, plan)
-    return plan, getattr(agent, "token_count", 0), api_calls
+    res = _exec_plan(env, plan)
+    return plan, getattr(agent, "token_count", 0), api_calls, {"first_failure": res.first_failure}
 
-def wrap_hmas2(env):
+def wrap_hmas2(env, detectors=(), structured=False):
     etype = "boxnet2" if isinstance(env, BoxNet2) else "boxnet1"
-    agent = HMAS2.HMAS2(environment_type=etype)
+    agent = HMAS2.HMAS2(environment_type=etype, detectors=detectors, structured=structured)
     agent.env = env
 
     # patch central‐prompt to bind this env
@@ -155,20 +170,12 @@ def wrap_hmas2(env):
         return h.format_central_prompt(h.env)
     agent.format_central_prompt = fix_prompt
 
-    # count calls
-    api_calls = 0
-    orig = agent.call_llm
-    def patched(prompt):
-        nonlocal api_calls
-        api_calls += 1
-        return orig(prompt)
-    agent.call_llm = patched
-
-    plan, _ = agent.runHMAS2()
-    _exec_plan(env, plan)
-    return plan, getattr(agent, "token_count", 0), api_calls
+    plan, api_calls = agent.runHMAS2()
+    res = _exec_plan(env, plan)
+    return plan, getattr(agent, "token_count", 0), api_calls, {"stop_reason": agent.stop_reason,
+                                                               "first_failure": res.first_failure}
 
-def wrap_etp(env, max_attempts: int = 3):
+def wrap_etp(env, max_attempts: int = 3, stream=False, structured=False):
     # ensure BoxNet2 agents have `.cell`
     if isinstance(env, BoxNet2):
         for ag in env.agents:
@@ -178,19 +185,41 @@ def wrap_etp(env, max_attempts: int = 3):
     tot_tok = 0
     calls   = 0
     last_actions = None
-
-    for _ in range(max_attempts):
-        prompt       = ETP.intialPlan(env)
-        reply, used  = ETP.call_llm(prompt)
-        tot_tok     += used
-        calls       += 1
-        acts         = ETP.parse_llm_plan(reply)
-        last_actions = acts
-        if ETP.execute_plan(env, acts):
-            break
-
-    _exec_plan(env, last_actions)
-    return last_actions, tot_tok, calls
+    first_failure = None
+
+    if stream and not structured:
+        # replan as soon as a streamed action is invalid; valid prefixes are kept
+        executed = []
+        for attempt in range(max_attempts):
+            with tracing.span(f"attempt {attempt}", "round"), ledger.tagged(round=attempt):
+                prompt = ETP.intialPlan(env)
+                _, used, acts, failed_at = ETP.stream_plan(env, prompt)
+                tot_tok += used
+                calls   += 1
+                _exec_plan(env, acts[:failed_at])
+                executed += acts[:failed_at]
+                if failed_at is None:
+                    break
+                if first_failure is None:
+                    first_failure = len(executed)
+        return executed, tot_tok, calls, {"first_failure": first_failure}
+
+    for attempt in range(max_attempts):
+        with tracing.span(f"attempt {attempt}", "round"), ledger.tagged(round=attempt):
+            prompt       = ETP.intialPlan(env)
+            reply, used  = ETP.call_llm(prompt, env, structured)
+            tot_tok     += used
+            calls       += 1
+            acts         = ETP.parse_llm_plan(reply)
+            last_actions = acts
+            # each attempt already runs on env; the plan is not executed again
+            res = executor.execute_plan(env, acts)
+            if res.ok:
+                break
+            if first_failure is None:
+                first_failure = res.first_failure
+
+    return last_actions, tot_tok, calls, {"first_failure": first_failure}
 
 PLANNERS    = {
     "CMAS"  : wrap_cmas,
@@ -201,6 +230,10 @@ PLANNERS    = {
 }
 ENVIRONMENTS = {"BoxNet1": BoxNet1, "BoxNet2": BoxNet2}
 
+def make_env(env_fn, trial):
+    """A fresh env; generated scenarios are seeded with the trial number."""
+    return env_fn(seed=trial) if isinstance(env_fn, scenarios.Scenario) else env_fn()
+
 # ────────────────────────────────────────────────────────────
 #  Metric helpers
 # ────────────────────────────────────────────────────────────
@@ -230,65 +263,369 @@ def step_count(plan):
 # ────────────────────────────────────────────────────────────
 #  Batch runner
 # ────────────────────────────────────────────────────────────
-def batch_test(trials=10, outdir="results"):
-    os.makedirs(outdir, exist_ok=True)
-    ts      = datetime.now().strftime("%Y%m%d_%H%M%S")
-    raw_csv = os.path.join(outdir, f"raw_{ts}.csv")
-    summ    = os.path.join(outdir, f"summary_{ts}.csv")
-    cols    = ["environment","framework","success_rate_pct","steps","api_calls","tokens"]
-
-    rows = []
-    with open(raw_csv, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=cols)
-        writer.writeheader()
-
-        for env_name, Env in ENVIRONMENTS.items():
-            for fw_name, fw_fn in PLANNERS.items():
-                print(f"\n🔹 Framework = {fw_name} / Environment = {env_name}")
-                for _ in tqdm(range(trials), desc=f"{fw_name}-{env_name}", unit="trial"):
-                    env = Env()
-                    try:
-                        plan, tokens, calls = fw_fn(env)
-                    except Exception:
-                        traceback.print_exc()
-                        plan, tokens, calls = None, 0, 0
-
-                    row = dict(
-                        environment      = env_name,
-                        framework        = fw_name,
-                        success_rate_pct = success_pct(
-                            env.goals,
-                            {b.color: list(b.positions) for b in env.boxes},
-                            is_boxnet2=isinstance(env, BoxNet2)
-                        ),
-                        steps     = step_count(plan),
-                        api_calls = calls,
-                        tokens    = tokens
-                    )
-                    writer.writerow(row)
-                    f.flush()
-                    rows.append(row)
-
-    # ── Summary & plots ──────────────────────────────────────
-    df  = pd.DataFrame(rows)
-    agg = df.groupby(["environment","framework"]).mean(numeric_only=True)
+def run_trial(env_name, fw_name, trial, fw_fn=None, record=False, replay=None, env_fn=None):
+    """
+    Run one (environment, framework, trial) cell on a fresh env; return its
+    CSV row. The row's "_calls" entry holds the per‑call latency records,
+    "_ledger" the token ledger entries, "_output_tokens" the completion
+    tokens per planner and mode, "_cache" the response cache hits / misses,
+    "_limiter" the rate limiter's retries and failures, and "_spans" the
+    timeline spans recorded in a worker process. With *record* the row's "_tape" holds the
+    trial's prompts and replies; with *replay* (recorded calls) the LLM is
+    never called and "_mismatches" lists the prompts that changed.
+    """
+    fw_fn = fw_fn or PLANNERS[fw_name]
+    env = None
+    rec  = latency.Recorder(environment=env_name, framework=fw_name, trial=trial)
+    book = ledger.Ledger(planner=fw_name, environment=env_name, trial=trial)
+    tape = cassette.Tape(replay) if replay is not None else cassette.Tape() if record else None
+    with latency.recording(rec), ledger.recording(book), cassette.using(tape), \
+         structured_output.recording() as outputs, llm_cache.recording() as cache_counts, \
+         ratelimit.recording() as limiter_counts, \
+         tracing.span(f"{fw_name} #{trial}", "trial", environment=env_name, framework=fw_name, trial=trial):
+        try:
+            # a generated board that cannot be built is reported like a planner error
+            env = make_env(env_fn or ENVIRONMENTS[env_name], trial)
+            plan, tokens, calls, *extra = fw_fn(env)
+            info = extra[0] if extra else {}
+        except Exception as exc:
+            # reached only once the limiter's retries are used up, or for non‑API errors
+            traceback.print_exc()
+            plan, tokens, calls = None, 0, 0
+            info = {"stop_reason": f"error:{type(exc).__name__}"}
+        spent = book.totals()
+        tracing.annotate(api_calls=calls, **spent, **info)
+
+    return dict(
+        environment      = env_name,
+        framework        = fw_name,
+        trial            = trial,
+        success_rate_pct = success_pct(
+            env.goals,
+            {b.color: list(b.positions) for b in env.boxes},
+            is_boxnet2=isinstance(env, BoxNet2)
+        ) if env is not None else 0.0,
+        steps     = step_count(plan),
+        api_calls = calls,
+        # the ledger counts every call; planners' own totals disagreed
+        tokens    = spent["prompt_tokens"] + spent["completion_tokens"] or tokens,
+        **spent,
+        stop_reason = info.get("stop_reason", ""),
+        first_failure = "" if info.get("first_failure") is None else info["first_failure"],
+        **rec.columns(),
+        _calls = rec.calls,
+        _ledger = book.entries,
+        _output_tokens = outputs,
+        _cache = cache_counts,
+        _limiter = limiter_counts,
+        _spans = tracing.drain() if tracing.is_worker() else [],
+        _tape = tape.calls if record else None,
+        _mismatches = tape.mismatches if replay is not None else [],
+        _unused = tape.unused if replay is not None else 0,
+    )
+
+def _run_jobs(jobs, workers=1, pool="thread", record=False, tapes=None):
+    """
+    Yield one row per (env_name, fw_name, trial) job, in job order.
+    With workers > 1 the jobs run on a thread or process pool; rows are
+    still released in job order, so the CSV is deterministic. *tapes* maps
+    jobs to the recorded calls they replay.
+    """
+    replay = (lambda job: tapes.get(job, [])) if tapes is not None else (lambda job: None)
+    if workers <= 1:
+        for job in jobs:
+            yield run_trial(*job, record=record, replay=replay(job))
+        return
+    if pool == "process":
+        # workers rebuild their own pooled client / cache / limiter from the
+        # parent's settings; the rate limits and the in‑flight ceiling are
+        # split between them
+        settings = llm.settings()
+        settings["rpm"] /= workers
+        settings["tpm"] /= workers
+        settings["max_in_flight"] = max(1, settings["max_in_flight"] // workers)
+        ex = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(settings, tracing.enabled(), dict(ledger.PRICES)))
+    else:
+        ex = ThreadPoolExecutor(max_workers=workers)
+    with ex:
+        futures = [ex.submit(run_trial, env_name, fw_name, trial, PLANNERS[fw_name],
+                             record, replay((env_name, fw_name, trial)), ENVIRONMENTS[env_name])
+                   for env_name, fw_name, trial in jobs]
+        try:
+            for fut in futures:
+                yield fut.result()
+        finally:
+            # on Ctrl‑C / error, drop the jobs that have not started yet
+            for fut in futures:
+                fut.cancel()
+
+def _init_worker(llm_settings, trace=False, prices=None):
+    llm.configure(**llm_settings)
+    ledger.PRICES.update(prices or {})
+    if trace:
+        tracing.enable(worker=True)
+
+def write_summary(raw_csv, outdir, ts):
+    """Per‑framework means and bar plots, computed from the whole raw CSV."""
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    df  = pd.read_csv(raw_csv)
+    agg = df.drop(columns=["trial", "first_failure"], errors="ignore").groupby(["environment","framework"]).mean(numeric_only=True)
+    summ = os.path.join(outdir, f"summary_{ts}.csv")
     agg.to_csv(summ)
 
     for col,label in [
-        ("success_rate_pct","Success Rate (%)"),
+        ("success_rate_pct","Success Rate (%)"),
         ("steps",           "Steps"),
-        ("api_calls",       "API Calls"),
+        ("api_calls",       "API Calls"),
         ("tokens",          "Tokens")
     ]:
         plt.figure(figsize=(9,6))
-        agg.unstack()[col].plot.bar(title=f"{label} by Framework & Environment")
+        agg.unstack()[col].plot.bar(title=f"{label} by Framework & Environment")
         plt.ylabel(label)
         plt.tight_layout()
         plt.savefig(os.path.join(outdir,f"{col}_{ts}.png"))
         plt.close()
+    return summ
+
+LATENCY_COLS = [f"{p}_s" for p in latency.PHASES] + ["wall_s"]
+RAW_COLS = ["environment","framework","trial","success_rate_pct","steps","api_calls","tokens",
+            "prompt_tokens","completion_tokens","cost_usd","stop_reason",
+            "first_failure"] + LATENCY_COLS
+
+def write_costs(raw_csv, outdir, ts):
+    """Tokens and USD per environment / framework, incl. cost per successful trial."""
+    import pandas as pd
+    df = pd.read_csv(raw_csv)
+    df["success"] = df["success_rate_pct"] >= 100.0
+    g  = df.groupby(["environment","framework"])
+    costs = pd.DataFrame({
+        "trials":            g.size(),
+        "successes":         g["success"].sum(),
+        "prompt_tokens":     g["prompt_tokens"].sum(),
+        "completion_tokens": g["completion_tokens"].sum(),
+        "cost_usd":          g["cost_usd"].sum(),
+    })
+    costs["cost_per_trial_usd"]   = costs["cost_usd"] / costs["trials"]
+    costs["cost_per_success_usd"] = costs["cost_usd"] / costs["successes"].where(costs["successes"] > 0)
+    path = os.path.join(outdir, f"cost_{ts}.csv")
+    costs.round(6).to_csv(path)
+    return path, costs
+
+def write_latency(raw_csv, outdir, ts, trace=None):
+    """p50 / p95 / p99 of every latency column (and of single calls, if traced)."""
+    import pandas as pd
+    qs   = [0.5, 0.95, 0.99]
+    df   = pd.read_csv(raw_csv)
+    lat  = df.groupby(["environment","framework"])[LATENCY_COLS].quantile(qs).unstack()
+    lat.columns = [f"{col}_p{round(q * 100)}" for col, q in lat.columns]
+    if trace and os.path.exists(trace) and os.path.getsize(trace):
+        calls = pd.read_json(trace, lines=True)
+        per_call = calls.groupby(["environment","framework"])[["ttfb_s","total_s"]].quantile(qs).unstack()
+        per_call.columns = [f"call_{col}_p{round(q * 100)}" for col, q in per_call.columns]
+        lat = lat.join(per_call)
+    path = os.path.join(outdir, f"latency_{ts}.csv")
+    lat.round(4).to_csv(path)
+    return path
+
+def load_raw_rows(raw_csv):
+    """
+    Complete rows of an existing raw CSV. A row cut short by a crash is
+    dropped, and the file is rewritten without it so it can be appended to.
+    """
+    with open(raw_csv, newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames != RAW_COLS:
+            raise ValueError(f"{raw_csv} has columns {reader.fieldnames}, expected {RAW_COLS}")
+        rows, broken = [], 0
+        for r in reader:
+            try:
+                r["trial"] = int(r["trial"])
+            except (TypeError, ValueError):
+                broken += 1
+                continue
+            if None in r or None in r.values():
+                broken += 1
+                continue
+            rows.append(r)
+    if broken:
+        with open(raw_csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RAW_COLS)
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+# CLI options that change what a run's trials are; kept in run_<ts>.json for --resume
+RUN_OPTIONS = ("trials", "scenario_set", "structured", "stream", "dmas_schedule", "dmas_window",
+               "dmas_digest", "stop_on", "replay", "prices")
+
+
+def load_run_options(outdir, ts):
+    """The RUN_OPTIONS an earlier run was started with, or None if it predates run_<ts>.json."""
+    path = os.path.join(outdir, f"run_{ts}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def batch_test(trials=10, outdir="results", workers=1, pool="thread", resume=None,
+               trace=False, timeline=False, record=None, replay=None, plots=True,
+               options=None):
+    """
+    Run every (environment, framework, trial) cell. With *resume* set to the
+    run id (timestamp) of an earlier run, cells already in its raw CSV are
+    skipped, new rows are appended, and summary / plots are rebuilt from the
+    whole file. With *trace*, every LLM call is appended to trace_<ts>.jsonl;
+    with *timeline*, the spans of this invocation go to timeline_<ts>.json.
+    *record* is a cassette path to save every trial's prompts and replies to;
+    *replay* a cassette whose trials are rerun instead of *trials* fresh ones,
+    without calling the LLM — changed prompts go to mismatch_<ts>.jsonl.
+    With *plots* off the summary / latency / cost reports are skipped (and
+    pandas / matplotlib never imported); `--resume <ts>` builds them later.
+    *options* (the CLI's RUN_OPTIONS) are written to run_<ts>.json so that
+    a resumed run is finished with the settings it was started with.
+    """
+    from tqdm import tqdm
+    os.makedirs(outdir, exist_ok=True)
+    ts      = resume or datetime.now().strftime("%Y%m%d_%H%M%S")
+    raw_csv = os.path.join(outdir, f"raw_{ts}.csv")
+    trace_path = os.path.join(outdir, f"trace_{ts}.jsonl") if trace else None
+    ledger_path = os.path.join(outdir, f"ledger_{ts}.jsonl")
+    if timeline:
+        tracing.enable()
+
+    jobs = [(env_name, fw_name, trial)
+            for env_name in ENVIRONMENTS
+            for fw_name in PLANNERS
+            for trial in range(trials)]
+    tapes = None
+    if replay:
+        tapes = cassette.load(replay)
+        jobs = [job for job in tapes if job[0] in ENVIRONMENTS and job[1] in PLANNERS]
+        unknown = sorted({job[0] for job in tapes} - set(ENVIRONMENTS))
+        if unknown:
+            # a cassette recorded with --scenario-set names generated boards
+            found = [s for s in map(scenarios.Scenario.from_name, unknown) if s]
+            hint = (f"replay with --scenario-set {','.join(s.spec for s in found)}" if found
+                    else "replay without --scenario-set")
+            msg = (f"{sum(job[0] in unknown for job in tapes)} recorded trials are on "
+                   f"environments this run does not have ({', '.join(unknown)}); {hint}")
+            if not jobs:
+                raise ValueError(msg)
+            print(f"⚠ Skipping {msg}")
+        print(f"⏵ Replaying {len(jobs)} trials from {replay}")
+
+    if resume:
+        if not os.path.exists(raw_csv):
+            raise FileNotFoundError(f"no run {resume!r} in {outdir} ({raw_csv} missing)")
+        done = {(r["environment"], r["framework"], r["trial"]) for r in load_raw_rows(raw_csv)}
+        jobs = [job for job in jobs if job not in done]
+        print(f"↻ Resuming run {ts}: {len(done)} trials done, {len(jobs)} to go")
+    options_path = os.path.join(outdir, f"run_{ts}.json")
+    if options is not None and not os.path.exists(options_path):
+        with open(options_path, "w") as f:
+            json.dump(options, f, indent=1)
+
+    tf = open(trace_path, "a" if resume else "w") if trace_path else None
+    lf = open(ledger_path, "a" if resume else "w")
+    cf = cassette.open_writer(record, append=bool(resume)) if record else None
+    mismatch_path = os.path.join(outdir, f"mismatch_{ts}.jsonl") if replay else None
+    mf = open(mismatch_path, "a" if resume else "w") if mismatch_path else None
+    mismatched = unused = 0
+    spent_usd = 0.0
+    # summed from the rows: with --pool process the parent's cache and limiter see no calls
+    cache_counts = {"hits": 0, "misses": 0}
+    limiter_counts = dict.fromkeys(("calls", "retries", "rate_limit", "server", "connection", "failed"), 0)
+    with open(raw_csv, "a" if resume else "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RAW_COLS)
+        if not resume:
+            writer.writeheader()
+
+        # the parent is the only writer; workers just return rows
+        for row in tqdm(_run_jobs(jobs, workers, pool, bool(record), tapes),
+                        total=len(jobs), unit="trial"):
+            calls = row.pop("_calls", [])
+            tracing.extend(row.pop("_spans", []))
+            lf.writelines(json.dumps(e) + "\n" for e in row.pop("_ledger", []))
+            structured_output.merge(row.pop("_output_tokens", {}))
+            for k, v in row.pop("_cache", {}).items():
+                cache_counts[k] += v
+            for k, v in row.pop("_limiter", {}).items():
+                limiter_counts[k] += v
+            lf.flush()
+            tape, mismatches = row.pop("_tape", None), row.pop("_mismatches", [])
+            unused += row.pop("_unused", 0)
+            spent_usd += row["cost_usd"]
+            if cf:
+                cassette.write_trial(cf, row["environment"], row["framework"], row["trial"], tape)
+                cf.flush()
+            if mf and mismatches:
+                mismatched += 1
+                mf.writelines(json.dumps({"environment": row["environment"], "framework": row["framework"],
+                                          "trial": row["trial"], **m}) + "\n" for m in mismatches)
+                mf.flush()
+            writer.writerow(row)
+            f.flush()
+            if tf:
+                tf.writelines(json.dumps(c) + "\n" for c in calls)
+                tf.flush()
+    if tf:
+        tf.close()
+    lf.close()
+    if cf:
+        cf.close()
+    if mf:
+        mf.close()
 
     print("\n✔ Raw CSV   →", raw_csv)
-    print("✔ Summary   →", summ)
+    if plots:
+        summ = write_summary(raw_csv, outdir, ts)
+        lat  = write_latency(raw_csv, outdir, ts, trace_path)
+        cost_csv, costs = write_costs(raw_csv, outdir, ts)
+        print("✔ Summary   →", summ)
+        print("✔ Latency   →", lat)
+        print("✔ Ledger    →", ledger_path)
+        print("✔ Cost      →", cost_csv)
+        for (env_name, fw_name), c in costs.iterrows():
+            per_success = ("n/a" if c["successes"] == 0
+                           else f"${c['cost_per_success_usd']:.4f}")
+            print(f"    {env_name:<8} {fw_name:<7} ${c['cost_usd']:.4f} total, "
+                  f"${c['cost_per_trial_usd']:.4f}/trial, {per_success}/success")
+    else:
+        print("✔ Ledger    →", ledger_path)
+        print(f"✔ Cost      → ${spent_usd:.4f} this run (reports skipped; "
+              f"--resume {ts} builds them)")
+    if trace_path:
+        print("✔ Call trace →", trace_path)
+    if record:
+        print("✔ Cassette  →", record)
+    if replay:
+        print(f"✔ Replay    → {mismatched} of {len(jobs)} trials sent changed prompts, "
+              f"{unused} recorded calls unused ({mismatch_path})")
+    if timeline:
+        tl = os.path.join(outdir, f"timeline_{ts}.json")
+        n  = tracing.write(tl)
+        tracing.disable()
+        print(f"✔ Timeline  → {tl} ({n} spans; open in ui.perfetto.dev)")
+    report = structured_output.output_token_report()
+    if report:
+        print("✔ Mean completion tokens per call →")
+        for planner, modes in report.items():
+            print(f"    {planner:<7} " + ", ".join(f"{k}={v}" for k, v in modes.items()))
+    lim = limiter_counts
+    if lim["retries"] or lim["failed"]:
+        # each worker process has its own AIMD limit, which the parent cannot see
+        limit = ("" if workers > 1 and pool == "process"
+                 else f", in‑flight limit now {llm.get_limiter().stats()['in_flight_limit']}")
+        print(f"✔ Rate limiter → {lim['retries']} retries ({lim['rate_limit']}× 429, "
+              f"{lim['server']}× 5xx, {lim['connection']}× connection), {lim['failed']} gave up{limit}")
+    cache = llm.get_cache()
+    if cache is not None:
+        st = cache.stats()
+        print(f"✔ LLM cache → {cache_counts['hits']} hits / {cache_counts['misses']} misses "
+              f"({st['entries']} entries, {st['bytes'] / 1e6:.1f} MB)")
 
 # ────────────────────────────────────────────────────────────
 #  CLI
@@ -297,5 +634,105 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("-n","--trials",type=int,default=5)
     ap.add_argument("-o","--outdir",    default="results")
+    ap.add_argument("--cache", metavar="PATH",
+                    help="SQLite file for caching temperature‑0 LLM responses")
+    ap.add_argument("--cache-max-mb", type=float, default=256,
+                    help="evict least‑recently‑used responses beyond this size")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="bypass the response cache (neither read nor write)")
+    ap.add_argument("--dmas-schedule", choices=["sequential","wavefront"], default="sequential",
+                    help="DMAS dialogue order: one agent at a time, or colour classes of non‑adjacent agents in parallel")
+    ap.add_argument("--dmas-window", type=int, default=DMAS.HISTORY_WINDOW,
+                    help="neighbour replies shown to each DMAS agent (0 = all)")
+    ap.add_argument("--dmas-digest", action="store_true",
+                    help="summarise neighbour replies older than the window")
+    ap.add_argument("--stop-on", default="",
+                    help=f"comma‑separated convergence detectors for DMAS/HMAS‑2 ({', '.join(DETECTORS)})")
+    ap.add_argument("--stream", action="store_true",
+                    help="CMAS/ETP: stream plans and abort at the first invalid action")
+    ap.add_argument("--structured", action="store_true",
+                    help="ask every planner for JSON plans instead of free text")
+    ap.add_argument("-w","--workers", type=int, default=1,
+                    help="run independent (env, framework, trial) jobs in parallel")
+    ap.add_argument("--pool", choices=["thread","process"], default="thread",
+                    help="worker pool used with --workers > 1")
+    ap.add_argument("--resume", metavar="RUN_ID",
+                    help="finish an interrupted run (the timestamp in its raw_<RUN_ID>.csv)")
+    ap.add_argument("--base-url", metavar="URL",
+                    help="OpenAI‑compatible endpoint, e.g. local_llm_server.py at http://127.0.0.1:8765/v1")
+    ap.add_argument("--rpm", type=float, default=None,
+                    help="LLM requests per minute shared by all planners (default: LLM_RPM or unlimited)")
+    ap.add_argument("--tpm", type=float, default=None,
+                    help="LLM tokens per minute, reserved from a prompt estimate (default: LLM_TPM or unlimited)")
+    ap.add_argument("--prices", metavar="JSON",
+                    help='USD per 1M tokens, {"model": [prompt, completion]}, merged into ledger.PRICES')
+    ap.add_argument("--trace", action="store_true",
+                    help="write every LLM call's latency and tokens to trace_<run>.jsonl")
+    ap.add_argument("--timeline", action="store_true",
+                    help="write a Chrome trace of the run (trial → round → agent → call) to timeline_<run>.json")
+    tape = ap.add_mutually_exclusive_group()
+    tape.add_argument("--record", metavar="CASSETTE",
+                      help="save every prompt / reply of the run to a gzip'd cassette")
+    tape.add_argument("--replay", metavar="CASSETTE",
+                      help="rerun the cassette's trials offline from the recorded replies")
+    ap.add_argument("--log-level", default="WARNING",
+                    choices=["DEBUG","INFO","WARNING","ERROR"],
+                    help="executor log level (INFO shows every executed step)")
+    ap.add_argument("--scenario-set", metavar="SPEC",
+                    help=f"generated boards instead of BoxNet1/BoxNet2: {', '.join(scenarios.SETS)} "
+                         "or e.g. boxnet1:4x8,boxnet2:9x9:20 (kind:ROWSxCOLS[:BOXES[:COLORS]])")
+    ap.add_argument("--no-plots", action="store_true",
+                    help="skip the pandas / matplotlib summaries, plots and cost report")
     args = ap.parse_args()
-    batch_test(args.trials,args.outdir)
+    if args.resume:
+        saved = load_run_options(args.outdir, args.resume)
+        if saved is None:
+            print(f"⚠ Run {args.resume} has no run_{args.resume}.json; resuming with this command's options")
+        else:
+            # options left off the command line are taken from the run; any given must match it
+            given = ap.parse_args(namespace=argparse.Namespace(**dict.fromkeys(RUN_OPTIONS)))
+            changed = [k for k in RUN_OPTIONS
+                       if getattr(given, k) is not None and getattr(given, k) != saved.get(k, ap.get_default(k))]
+            if changed:
+                ap.error(f"run {args.resume} was started with "
+                         + ", ".join(f"--{k.replace('_', '-')}={saved.get(k, ap.get_default(k))!r}" for k in changed)
+                         + "; resume it with the same options or leave them off")
+            vars(args).update({k: v for k, v in saved.items() if k in RUN_OPTIONS})
+    logging.basicConfig(level=args.log_level, format="%(levelname)s %(name)s: %(message)s")
+    detectors = tuple(d for d in args.stop_on.split(",") if d)
+    unknown = set(detectors) - set(DETECTORS)
+    if unknown:
+        ap.error(f"unknown detectors: {', '.join(sorted(unknown))}")
+    planner_opts = {
+        "CMAS"  : dict(stream=args.stream, structured=args.structured),
+        "DMAS"  : dict(schedule=args.dmas_schedule, window=args.dmas_window or None,
+                       digest=args.dmas_digest, detectors=detectors, structured=args.structured),
+        "HMAS‑1": dict(structured=args.structured),
+        "HMAS‑2": dict(detectors=detectors, structured=args.structured),
+        "ETP"   : dict(stream=args.stream, structured=args.structured),
+    }
+    if args.scenario_set:
+        try:
+            sets = scenarios.parse_set(args.scenario_set)
+        except ValueError as exc:
+            ap.error(str(exc))
+        ENVIRONMENTS.clear()
+        ENVIRONMENTS.update(sets)
+    if args.prices:
+        ledger.load_prices(args.prices)
+    limits = {k: v for k, v in (("rpm", args.rpm), ("tpm", args.tpm)) if v is not None}
+    if limits:
+        llm.configure(**limits)
+    if args.base_url:
+        llm.configure(base_url=args.base_url)
+    for name, opts in planner_opts.items():
+        PLANNERS[name] = partial(PLANNERS[name], **opts)
+    if args.cache:
+        llm.configure(cache_path=args.cache, cache_max_mb=args.cache_max_mb,
+                      cache_bypass=args.no_cache)
+    elif args.no_cache:
+        llm.configure(cache_path=None)
+    batch_test(args.trials, args.outdir, workers=args.workers, pool=args.pool,
+               resume=args.resume, trace=args.trace,
+               timeline=args.timeline, record=args.record, replay=args.replay,
+               plots=not args.no_plots, options={k: getattr(args, k) for k in RUN_OPTIONS})
@@ -0,0 +1,98 @@
+"""
+Benchmark: the corner model of BoxNet2.py on grids up to 100×100.
+
+    python bench_boxnet2.py [--sizes 10,30,100] [--sample AGENTS] [--fill 0.3]
+
+For each size it builds the environment, places boxes on a fraction of
+the corners, and times `Agent.get_available_actions` for every agent.
+The legacy per‑agent scan of every corner (and its duplicated corners)
+is timed on a sample of agents for comparison.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from BoxNet2 import BoxNet2, CORNER_OFFSETS
+
+
+def legacy_corners(grid_width, grid_height):
+    """The corner list the constructor used to build: one copy per adjacent cell."""
+    corners = []
+    for x in range(grid_width + 1):
+        for y in range(grid_height + 1):
+            connected = [(x + dx, y + dy) for dx, dy, _ in CORNER_OFFSETS
+                         if 0 <= x + dx < grid_width and 0 <= y + dy < grid_height]
+            for dx, dy, corner_id in CORNER_OFFSETS:
+                if 0 <= x + dx < grid_width and 0 <= y + dy < grid_height:
+                    corners.append(((x, y, corner_id), connected))
+    return corners
+
+
+def legacy_available_actions(corners, occupied, goals, cell):
+    """The old Agent.get_available_actions: a scan of every corner per agent."""
+    actions = []
+    cell_corners = [(pos, cells) for pos, cells in corners if cell in cells]
+    for pos, _ in cell_corners:
+        box = occupied.get(pos[:2])
+        if box:
+            for target, _ in cell_corners:
+                if target != pos and not occupied.get(target[:2]):
+                    actions.append(f"move_box_corner_to_corner({box}, {target})")
+            for goal_pos in goals.get(box, ()):
+                if tuple(goal_pos[:2]) == cell:
+                    actions.append(f"move_box_corner_to_goal({box}, {goal_pos})")
+    actions.append("do_nothing()")
+    return actions
+
+
+def build(size, fill, seed=0):
+    rng = random.Random(seed)
+    env = BoxNet2(size, size)
+    colors = ["blue", "yellow", "red", "purple", "green"]
+    boxes = [(rng.choice(colors), corner.position)
+             for corner in env.corners if rng.random() < fill]
+    goals = {c: [(rng.randrange(size), rng.randrange(size)) for _ in range(3)] for c in colors}
+    cells = [(x, y) for x in range(size) for y in range(size)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        env.setup_scenario(boxes, goals, cells)
+    return env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,30,100")
+    ap.add_argument("--sample", type=int, default=50, help="agents timed with the legacy scan")
+    ap.add_argument("--fill", type=float, default=0.3, help="fraction of corners holding a box")
+    args = ap.parse_args()
+
+    print(f"{'grid':>9} {'corners':>15} {'build ms':>9} {'all agents ms':>14} "
+          f"{'µs/agent':>9} {'legacy µs/agent':>16} {'speed‑up':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        t0 = time.perf_counter()
+        env = build(size, args.fill)
+        built = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        n_actions = sum(len(a.get_available_actions(env)) for a in env.agents)
+        every = time.perf_counter() - t0
+        per_agent = every / len(env.agents)
+
+        corners = legacy_corners(size, size)
+        occupied = {c.position[:2]: c.occupied_by.color for c in env.corners if c.occupied_by}
+        sample = random.Random(1).sample(env.agents, min(args.sample, len(env.agents)))
+        t0 = time.perf_counter()
+        for agent in sample:
+            legacy_available_actions(corners, occupied, env.goals, agent.cell_position)
+        legacy = (time.perf_counter() - t0) / len(sample)
+
+        print(f"{size:>4}×{size:<4} {len(env.corners):>6} ({len(corners):>6}) {built * 1e3:>9.1f} "
+              f"{every * 1e3:>14.1f} {per_agent * 1e6:>9.1f} {legacy * 1e6:>16.1f} "
+              f"{legacy / per_agent:>8.0f}×")
+        assert n_actions >= len(env.agents)
+
+
+if __name__ == "__main__":
+    main()
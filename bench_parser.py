@@ -0,0 +1,95 @@
+"""
+Micro‑benchmark: plan_parser vs. the per‑module regex parser it replaced.
+
+    python bench_parser.py [-n LINES] [-r REPEATS]
+
+Prints actions/sec for the legacy three‑`re.match`‑per‑line parser,
+plan_parser.parse_plan and the streaming PlanStream.
+"""
+
+import argparse
+import random
+import re
+import time
+
+from plan_parser import PlanStream, parse_plan
+
+
+def legacy_parse_llm_plan(text):
+    """The parser that used to be copied into CMAS / DMAS / HMAS / ETP."""
+    actions = []
+
+    pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)\]?)?"
+    pattern_nothing = r".*?Agent (\d+): do nothing"
+    pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
+
+    for line in text.strip().split('\n'):
+        move_match = re.match(pattern_move, line.strip())
+        nothing_match = re.match(pattern_nothing, line.strip())
+        move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
+
+        if move_match:
+            agent_id = int(move_match.group(1))
+            color = move_match.group(2)
+            from_pos = (int(move_match.group(3)), int(move_match.group(4)))
+            direction = move_match.group(7)
+            actions.append((agent_id, color, from_pos, direction))
+        elif nothing_match:
+            agent_id = int(nothing_match.group(1))
+            actions.append((agent_id, "none", None, "stay"))
+        elif move_to_goal_match:
+            agent_id = int(move_to_goal_match.group(1))
+            color = move_to_goal_match.group(2)
+            actions.append((agent_id, color, None, "goal"))
+
+    return actions
+
+
+def make_plan(n_lines, seed=0):
+    rng = random.Random(seed)
+    moves = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+    lines = []
+    for _ in range(n_lines):
+        aid = rng.randrange(8)
+        kind = rng.random()
+        if kind < 0.6:
+            color = rng.choice(["blue", "red", "yellow", "green", "purple"])
+            d = rng.choice(list(moves))
+            r, c = rng.randrange(1, 3), rng.randrange(1, 4)
+            lines.append(f"- Agent {aid}: move {color} box from ({r}, {c}) to "
+                         f"({r + moves[d][0]}, {c + moves[d][1]}) {d}")
+        elif kind < 0.8:
+            lines.append(f"- Agent {aid}: move red box to goal")
+        else:
+            lines.append(f"- Agent {aid}: do nothing")
+    return "\n".join(lines)
+
+
+def bench(name, fn, text, repeats):
+    n = len(fn(text))
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {n * repeats / elapsed:>12,.0f} actions/sec")
+
+
+def stream_parse(text, chunk=16):
+    stream = PlanStream()
+    for i in range(0, len(text), chunk):
+        stream.feed(text[i:i + chunk])
+    stream.close()
+    return stream.actions
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--lines", type=int, default=1000)
+    ap.add_argument("-r", "--repeats", type=int, default=50)
+    args = ap.parse_args()
+
+    text = make_plan(args.lines)
+    assert [tuple(a) for a in parse_plan(text)] == legacy_parse_llm_plan(text)
+    bench("legacy", legacy_parse_llm_plan, text, args.repeats)
+    bench("parse_plan", parse_plan, text, args.repeats)
+    bench("PlanStream", stream_parse, text, args.repeats)
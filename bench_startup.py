@@ -0,0 +1,100 @@
+"""
+Startup benchmark: how long the CLIs take before doing any work.
+
+    python bench_startup.py [-r REPEATS] [--cassette PATH] [--budget-ms 300] [--log PATH]
+
+Runs `batch_testing.py --help`, `simulator.py --help` and, with --cassette,
+an offline `--replay … --no-plots` run, each in a fresh interpreter. For
+every command it prints the median wall time and the import time reported
+by `python -X importtime`, plus the slowest imports. Exits with status 1
+if any command's import time is over the budget; --log appends the numbers
+as one JSON line so they can be tracked from commit to commit.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def commands(cassette=None, outdir=None):
+    cmds = {
+        "batch_testing --help": ["batch_testing.py", "--help"],
+        "simulator --help":     ["simulator.py", "--help"],
+    }
+    if cassette:
+        cmds["batch_testing --replay"] = ["batch_testing.py", "--replay", cassette,
+                                          "--no-plots", "-o", outdir]
+    return cmds
+
+
+def wall_ms(argv, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *argv], cwd=HERE, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def import_profile(argv):
+    """(total import ms, [(cumulative ms, module)] of top‑level imports)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=HERE, check=True,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    top = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue                              # the header line
+        if not name[1:].startswith(" "):          # not nested under another import
+            top.append((int(cumulative) / 1000, name.strip()))
+    return sum(ms for ms, _ in top), sorted(top, reverse=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-r", "--repeats", type=int, default=5)
+    ap.add_argument("--cassette", metavar="PATH", help="also time an offline replay of this cassette")
+    ap.add_argument("--budget-ms", type=float, default=300.0)
+    ap.add_argument("--top", type=int, default=5, help="slowest top‑level imports to list")
+    ap.add_argument("--log", metavar="PATH", help="append the results as a JSON line")
+    args = ap.parse_args()
+
+    results, over = {}, []
+    with tempfile.TemporaryDirectory() as outdir:
+        for label, argv in commands(args.cassette and os.path.abspath(args.cassette), outdir).items():
+            imports, slowest = import_profile(argv)
+            wall = wall_ms(argv, args.repeats)
+            results[label] = {"wall_ms": round(wall, 1), "import_ms": round(imports, 1)}
+            flag = "✅" if imports <= args.budget_ms else "❌"
+            print(f"{flag} {label:<24} wall {wall:7.1f} ms   imports {imports:7.1f} ms")
+            for ms, name in slowest[:args.top]:
+                print(f"      {ms:7.1f} ms  {name}")
+            if imports > args.budget_ms:
+                over.append(label)
+
+    if args.log:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                    capture_output=True, text=True).stdout.strip()
+        except OSError:
+            commit = ""
+        with open(args.log, "a") as f:
+            f.write(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit,
+                                "budget_ms": args.budget_ms, "results": results}) + "\n")
+    if over:
+        print(f"over the {args.budget_ms:.0f} ms import budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
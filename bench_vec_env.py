@@ -0,0 +1,83 @@
+"""
+Benchmark: scoring candidate plans with VecEnv against one env at a time.
+
+    python bench_vec_env.py [--plans 5000] [--boards boxnet1:4x8,boxnet2:5x9] [--seed 0]
+
+For each board it builds --plans candidate plans (the reference plan with
+a few random actions inserted, so some fail part‑way), scores them all with
+`vec_env.score`, and times the legacy loop of a deepcopy plus
+`executor.execute_plan` per plan on the same candidates. Both must give
+the same ok / steps / success for every plan.
+"""
+
+import argparse
+import copy
+import logging
+import random
+import time
+
+import executor
+import scenarios
+from batch_testing import success_pct
+from BoxNet2_test import BoxNet2
+from plan_parser import Action
+from vec_env import score
+
+
+def candidates(env, n, rng):
+    rows, cols = executor.grid_shape(env)
+    colors = [b.color for b in env.boxes]
+    base = scenarios.reference_plan(env)
+    plans = []
+    for _ in range(n):
+        plan = list(base)
+        for _ in range(rng.randrange(4)):
+            noise = Action(0, rng.choice(colors), (rng.randrange(rows), rng.randrange(cols)),
+                           rng.choice(executor.DIRECTIONS))
+            plan.insert(rng.randrange(len(plan) + 1), noise)
+        plans.append(plan)
+    return plans
+
+
+def legacy_score(env, plans):
+    """The loop VecEnv replaces: one copy of the board per plan, stepped in Python."""
+    out = []
+    for plan in plans:
+        board = copy.deepcopy(env)
+        res = executor.execute_plan(board, plan)
+        out.append((res.ok, len(res.steps), success_pct(
+            board.goals, {b.color: list(b.positions) for b in board.boxes},
+            is_boxnet2=isinstance(board, BoxNet2))))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plans", type=int, default=5000)
+    ap.add_argument("--boards", default="boxnet1:4x8,boxnet2:5x9")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    logging.getLogger("executor").setLevel(logging.ERROR)
+
+    print(f"{'board':>18} {'plans':>6} {'avg len':>8} {'VecEnv plans/s':>15} "
+          f"{'legacy plans/s':>15} {'speed‑up':>9} {'solved':>7}")
+    for name, scenario in scenarios.parse_set(args.boards).items():
+        env = scenario(args.seed)
+        plans = candidates(env, args.plans, random.Random(args.seed))
+
+        t0 = time.perf_counter()
+        res = score(env, plans)
+        vec = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        legacy = legacy_score(env, plans)
+        old = time.perf_counter() - t0
+
+        assert [(bool(o), int(s), float(p)) for o, s, p in zip(res.ok, res.steps, res.success_pct)] == legacy
+        avg = sum(map(len, plans)) / len(plans)
+        print(f"{name:>18} {len(plans):>6} {avg:>8.1f} {len(plans) / vec:>15.0f} "
+              f"{len(plans) / old:>15.0f} {old / vec:>8.0f}× {(res.success_pct == 100).mean():>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
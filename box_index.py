@@ -0,0 +1,73 @@
+"""
+Spatial hash of a BoxNet env's boxes.
+
+•  (row, col) → boxes, one entry per box position (a box with two
+   positions on one cell is listed twice, as the renderers count it)
+•  color → boxes
+•  BoxNet1 / BoxNet2 keep one as `env.index` and update it in `move_box`
+   and `move_to_goal`; code that edits `box.positions` directly must call
+   `env.index.rebuild(env.boxes)`
+
+Lookups return boxes in `env.boxes` order, so results match the linear
+scans they replace.
+"""
+
+from collections import defaultdict
+
+
+class BoxIndex:
+    def __init__(self, boxes):
+        self.rebuild(boxes)
+
+    def rebuild(self, boxes):
+        self.order = {box: i for i, box in enumerate(boxes)}
+        self.cells = defaultdict(list)
+        self.colors = defaultdict(list)
+        for box in boxes:
+            self.colors[box.color].append(box)
+            for pos in box.positions:
+                self.cells[tuple(pos)].append(box)
+
+    def _sorted(self, boxes):
+        return sorted(boxes, key=self.order.__getitem__) if len(boxes) > 1 else list(boxes)
+
+    # ── updates ────────────────────────────────────────────
+    def move(self, box, frm, to):
+        """*box* moved one position from *frm* to *to*."""
+        self.remove(box, frm)
+        self.cells[tuple(to)].append(box)
+
+    def remove(self, box, pos):
+        pos = tuple(pos)
+        here = self.cells[pos]
+        here.remove(box)
+        if not here:
+            del self.cells[pos]
+
+    def clear(self, box):
+        """Forget every position of *box* (call before emptying box.positions)."""
+        for pos in box.positions:
+            self.remove(box, pos)
+
+    # ── lookups ────────────────────────────────────────────
+    def box(self, color, pos):
+        """The first *color* box at *pos*, or None."""
+        if pos is None:
+            return None
+        matches = [b for b in self.cells.get(tuple(pos), ()) if b.color == color]
+        return min(matches, key=self.order.__getitem__) if matches else None
+
+    def at(self, pos):
+        """Boxes at *pos*, one entry per position."""
+        return self._sorted(self.cells.get(tuple(pos), ()))
+
+    def near(self, cells):
+        """Distinct boxes with a position in any of *cells*."""
+        return self._sorted({b for pos in cells for b in self.cells.get(tuple(pos), ())})
+
+    def of_color(self, color):
+        return list(self.colors.get(color, ()))
+
+    def counts(self):
+        """{(row, col): number of box positions there}."""
+        return {pos: len(boxes) for pos, boxes in self.cells.items()}
@@ -0,0 +1,209 @@
+"""
+Record / replay cassettes: every prompt and reply of a batch run, per trial.
+
+•  recording: `with using(Tape()):` — every call through `llm` (CMAS, DMAS
+   rounds, HMAS‑1 reviews, HMAS‑2 feedback, ETP retries, cache hits and
+   streams) is appended to the tape
+•  replay: `with using(Tape(calls)):` — calls are answered from the tape,
+   never touching the network or the rate limiter
+•  a replayed call is matched by its request key (model + messages + opts,
+   as in llm_cache); concurrent calls may arrive in any order. A call with
+   no matching key takes the next unused reply and is flagged as a prompt
+   mismatch
+•  `save(path, trials)` / `load(path)` keep one JSON line per trial, each
+   line its own gzip member, so every finished trial is complete on disk;
+   batch_testing.py appends trials as they finish (`open_writer`)
+•  `load` keeps every complete line of a damaged file (a run killed while
+   writing) and skips the rest; appending first cuts such a file back to
+   its complete trials
+
+A planner that asks for more calls than were recorded gets CassetteExhausted.
+"""
+
+import contextvars
+import gzip
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+import llm_cache
+
+_current = contextvars.ContextVar("cassette", default=None)
+
+
+class CassetteExhausted(RuntimeError):
+    """A replayed trial made more LLM calls than its recording holds."""
+
+
+def _prompt_of(messages):
+    return "\n".join(m.get("content") or "" for m in messages)
+
+
+def _first_difference(expected, got):
+    """Line number and both versions of the first differing prompt line."""
+    a, b = expected.splitlines(), got.splitlines()
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return {"line": i, "recorded": x, "replayed": y}
+    i = min(len(a), len(b))
+    return {"line": i, "recorded": a[i] if i < len(a) else None,
+            "replayed": b[i] if i < len(b) else None}
+
+
+class Tape:
+    """The calls of one trial; records when created empty, replays when given *calls*."""
+
+    def __init__(self, calls=None):
+        self.replaying = calls is not None
+        self.calls = list(calls or [])
+        self.mismatches = []
+        self._used = [False] * len(self.calls)
+        self._lock = threading.Lock()
+
+    def record(self, model, messages, opts, text, usage, cached=False, estimated=False):
+        """*cached* / *estimated* are kept so a replay prices the call as the run did."""
+        if self.replaying:
+            return
+        with self._lock:
+            self.calls.append({"key": llm_cache.make_key(model, messages, opts), "model": model,
+                               "messages": messages, "response": text, "usage": usage,
+                               "cached": cached, "estimated": estimated})
+
+    def replay(self, model, messages, opts):
+        """(text, usage, flags) recorded for this request; flags holds `cached` / `estimated`."""
+        key = llm_cache.make_key(model, messages, opts)
+        with self._lock:
+            index = next((i for i, c in enumerate(self.calls)
+                          if not self._used[i] and c["key"] == key), None)
+            if index is None:
+                index = next((i for i, used in enumerate(self._used) if not used), None)
+                if index is None:
+                    raise CassetteExhausted(f"no recorded call left for a {model} request")
+                recorded = self.calls[index]
+                self.mismatches.append({"call": index, "model": model,
+                                        **_first_difference(_prompt_of(recorded["messages"]),
+                                                            _prompt_of(messages))})
+            self._used[index] = True
+            call = self.calls[index]
+        flags = {"cached": call.get("cached", False), "estimated": call.get("estimated", False)}
+        return call["response"], dict(call["usage"]), flags
+
+    @property
+    def unused(self):
+        """Recorded calls the replay never asked for."""
+        return self._used.count(False)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def using(tape):
+    token = _current.set(tape)
+    try:
+        yield tape
+    finally:
+        _current.reset(token)
+
+
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+
+def _members(data):
+    """
+    Yield (start, end, text) per gzip member of *data*. A damaged or cut‑off
+    member yields the text it decoded up to its last complete line, with
+    end = None; the scan resumes at the next gzip header after it.
+    """
+    pos = 0
+    while pos < len(data):
+        d = zlib.decompressobj(wbits=31)
+        out, fed = [], pos
+        try:
+            while fed < len(data) and not d.eof:
+                chunk = data[fed:fed + (1 << 16)]
+                fed += len(chunk)
+                out.append(d.decompress(chunk))
+        except zlib.error:
+            pass
+        text = b"".join(out).decode("utf-8", "replace")
+        if d.eof:
+            end = fed - len(d.unused_data)
+            yield pos, end, text
+            pos = end
+            continue
+        yield pos, None, text[:text.rfind("\n") + 1]
+        nxt = data.find(GZIP_MAGIC, pos + 1)
+        if nxt < 0:
+            return
+        pos = nxt
+
+
+def _repair(path):
+    """Cut *path* back to its complete members, re‑writing the lines a damaged tail still holds."""
+    with open(path, "rb") as f:
+        data = f.read()
+    good, salvaged = 0, []
+    for start, end, text in _members(data):
+        if end is not None and not salvaged:
+            good = end
+        else:
+            salvaged.append(text)
+    if good == len(data):
+        return
+    with open(path, "r+b") as f:
+        f.truncate(good)
+        f.seek(good)
+        lines = [ln for ln in "".join(salvaged).splitlines(keepends=True) if _parse(ln)]
+        if lines:
+            f.write(gzip.compress("".join(lines).encode("utf-8")))
+
+
+def open_writer(path, append=False):
+    """A binary handle for `write_trial`; an existing file is repaired before appending."""
+    if append and os.path.exists(path):
+        _repair(path)
+    return open(path, "ab" if append else "wb")
+
+
+def write_trial(f, env_name, fw_name, trial, calls):
+    """Append one trial as a complete gzip member and flush it."""
+    line = json.dumps({"environment": env_name, "framework": fw_name,
+                       "trial": trial, "calls": calls}) + "\n"
+    f.write(gzip.compress(line.encode("utf-8")))
+    f.flush()
+
+
+def save(path, trials, append=False):
+    """Write {(environment, framework, trial): calls} as gzip'd JSON lines."""
+    with open_writer(path, append) as f:
+        for (env_name, fw_name, trial), calls in trials.items():
+            write_trial(f, env_name, fw_name, trial, calls)
+
+
+def _parse(line):
+    try:
+        rec = json.loads(line)
+        return rec if isinstance(rec, dict) and "calls" in rec else None
+    except ValueError:
+        return None
+
+
+def load(path):
+    """
+    {(environment, framework, trial): calls} from a cassette file (later
+    lines win). Lines of a damaged member are kept up to the cut; a line
+    that does not parse is skipped.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    trials = {}
+    for _, _, text in _members(data):
+        for line in text.splitlines():
+            rec = _parse(line) if line.strip() else None
+            if rec is not None:
+                trials[(rec["environment"], rec["framework"], rec["trial"])] = rec["calls"]
+    return trials
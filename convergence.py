@@ -0,0 +1,81 @@
+"""
+Early‑termination detectors for the DMAS and HMAS‑2 dialogue loops.
+
+A detector looks at the state after one round and returns True when the
+loop can stop. Loops take a list of detector names (keys of DETECTORS)
+and report the name of the first one that fired as their stop reason.
+
+•  repeat – every agent proposes the same action as in the previous round
+•  idle   – every agent proposes "do nothing"
+•  goals  – executing the current plan on a copy of the env reaches every goal
+"""
+
+import copy
+from typing import Dict, List, NamedTuple, Optional
+
+
+class RoundState(NamedTuple):
+    round: int
+    actions: Dict[int, tuple]            # agent id → parsed action this round
+    prev_actions: Optional[Dict[int, tuple]]
+    plan: List[tuple]                    # actions that would be executed now
+    env: object
+
+
+def repeated_actions(state: RoundState) -> bool:
+    return bool(state.actions) and state.prev_actions == state.actions
+
+
+def all_idle(state: RoundState) -> bool:
+    return bool(state.actions) and all(a[1] == "none" for a in state.actions.values())
+
+
+def goals_reached(env) -> bool:
+    """BoxNet2 clears a colour's goal list; BoxNet1 needs a box on every goal."""
+    if any(not hasattr(b, "positions") for b in env.boxes):
+        return False
+    if all(len(v) == 0 for v in env.goals.values()):
+        return True
+    boxes = {(b.color, tuple(p)) for b in env.boxes for p in b.positions}
+    return all((c, tuple(p)) in boxes for c, ps in env.goals.items() for p in ps)
+
+
+def reaches_goals(state: RoundState) -> bool:
+    if not state.plan:
+        return False
+    scratch = copy.deepcopy(state.env)
+    for agent_id, color, from_pos, direction in state.plan:
+        if color == "none":
+            continue
+        if direction == "goal":
+            if not hasattr(scratch, "move_to_goal"):
+                return False
+            scratch.move_to_goal(color)
+            continue
+        box = scratch.index.box(color, from_pos)
+        if box is None or not scratch.move_box(box, from_pos, direction):
+            return False
+    return goals_reached(scratch)
+
+
+DETECTORS = {
+    "repeat": repeated_actions,
+    "idle":   all_idle,
+    "goals":  reaches_goals,
+}
+
+
+def first_stop(detectors, state: RoundState) -> Optional[str]:
+    """Name of the first detector that fires for *state*, else None."""
+    for name in detectors or ():
+        if DETECTORS[name](state):
+            return name
+    return None
+
+
+def latest_per_agent(actions):
+    """Most recent action of every agent, keyed by agent id."""
+    latest = {}
+    for act in actions:
+        latest[act[0]] = act
+    return latest
@@ -0,0 +1,130 @@
+"""
+Headless execution of parsed plan actions on a BoxNet environment.
+
+•  `execute_plan(env, actions, pace=0)` – the one executor every planner and
+   the batch tester use; returns per‑step results and the first failing index
+•  progress goes to the "executor" logger (INFO per step, WARNING on failure)
+•  `stream_validated_plan` checks a streamed plan action by action
+"""
+
+import copy
+import logging
+import time
+from typing import List, NamedTuple, Optional
+
+import latency
+import llm
+from plan_parser import PlanStream
+
+DIRECTIONS = ("up", "down", "left", "right")
+
+log = logging.getLogger("executor")
+
+
+def grid_shape(env):
+    """(rows, cols) of a BoxNet env; BoxNet1 keeps rows in GRID_WIDTH."""
+    if hasattr(env, "move_to_goal"):   # BoxNet2
+        return env.GRID_HEIGHT, env.GRID_WIDTH
+    return env.GRID_WIDTH, env.GRID_HEIGHT
+
+
+def _apply(env, action):
+    """Apply one action; returns (ok, reason) where *reason* explains a failure."""
+    agent_id, color, from_pos, direction = action
+    if color == "none":
+        return True, "does nothing"
+    if direction == "goal":
+        if not hasattr(env, "move_to_goal"):
+            return False, "this environment has no goal action"
+        env.move_to_goal(color)
+        return True, "moved to goal"
+    if direction not in DIRECTIONS:
+        return False, f"invalid direction {direction!r}"
+    box = env.index.box(color, from_pos)
+    if box is None:
+        return False, f"no {color} box at {from_pos}"
+    if not env.move_box(box, from_pos, direction):
+        return False, f"cannot move {color} box {direction} from {from_pos}"
+    return True, f"moved {color} box {direction} from {from_pos}"
+
+
+def apply_action(env, action):
+    """
+    Apply one (agent_id, color, from_pos, direction) action to *env*.
+    Returns True if it was valid and applied, False otherwise.
+    """
+    return _apply(env, action)[0]
+
+
+class StepResult(NamedTuple):
+    index: int
+    action: tuple
+    ok: bool
+    reason: str
+
+
+class ExecResult(NamedTuple):
+    ok: bool                      # every executed step succeeded
+    steps: List[StepResult]
+    first_failure: Optional[int]  # index of the first failing action, or None
+
+
+@latency.timed("execute")
+def execute_plan(env, actions, pace=0.0, stop_on_failure=True):
+    """
+    Execute *actions* on *env* and return an ExecResult.
+
+    pace             – seconds to wait after each move; 0 for batch runs,
+                       > 0 only for demos that show the steps
+    stop_on_failure  – stop at the first failing action (CMAS / ETP) or keep
+                       going and record every failure (HMAS)
+    """
+    steps = []
+    first_failure = None
+    for index, action in enumerate(actions):
+        ok, reason = _apply(env, action)
+        steps.append(StepResult(index, action, ok, reason))
+        if ok:
+            log.info("✅ Agent %s %s", action[0], reason)
+        else:
+            log.warning("❌ Agent %s: %s", action[0], reason)
+            if first_failure is None:
+                first_failure = index
+            if stop_on_failure:
+                break
+        if pace and action[1] != "none":
+            time.sleep(pace)
+
+    log.debug("Final goals: %s", env.goals)
+    for box in env.boxes:
+        log.debug("%s box positions: %s", box.color, box.positions)
+    return ExecResult(first_failure is None, steps, first_failure)
+
+
+def stream_validated_plan(messages, env, model, **opts):
+    """
+    Stream a plan from the LLM, checking each action against a scratch copy
+    of *env* as soon as its line arrives. Generation is cancelled at the
+    first invalid action.
+
+    Returns (text, usage, actions, failed_at) where *failed_at* is the index
+    of the invalid action in *actions*, or None if every action was valid.
+    """
+    scratch = copy.deepcopy(env)
+    parser = PlanStream()
+    completion = llm.stream(messages, model, **opts)
+
+    def check(new):
+        base = len(parser.actions) - len(new)
+        for i, act in enumerate(new):
+            if not apply_action(scratch, act):
+                return base + i
+        return None
+
+    for chunk in completion:
+        failed_at = check(parser.feed(chunk))
+        if failed_at is not None:
+            completion.close()
+            return completion.text, completion.usage, parser.actions, failed_at
+    failed_at = check(parser.close())
+    return completion.text, completion.usage, parser.actions, failed_at
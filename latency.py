@@ -0,0 +1,126 @@
+"""
+Per‑phase latency spans for batch trials.
+
+•  `Recorder(**tags)` collects the time one trial spends in each phase:
+     prompt    – building prompts
+     llm_ttfb  – waiting for the first byte of each LLM reply
+     llm       – whole LLM calls (request → last byte)
+     parse     – turning replies into actions
+     execute   – running actions on the env
+•  `with recording(rec):` makes *rec* current for this thread and for the
+   calls it fans out through `llm.map_concurrent`
+•  planners mark phases with `span(phase)` / `@timed(phase)`; with no
+   recorder active both are a single ContextVar lookup
+•  `llm` reports every call through `record_call`, giving a per‑call trace
+•  while tracing.py is enabled every phase span also shows up on the timeline
+
+Concurrent calls (DMAS wavefront, HMAS‑1 reviews) each add their own
+duration, so a phase total can exceed the trial's wall time.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+PHASES = ("prompt", "llm_ttfb", "llm", "parse", "execute")
+
+_current = contextvars.ContextVar("latency_recorder", default=None)
+_open = contextvars.ContextVar("latency_open_phases", default=frozenset())
+
+
+class Recorder:
+    """Phase totals (seconds) and per‑call records of one trial."""
+
+    def __init__(self, **tags):
+        self.tags = tags
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.calls = []
+        self.start = time.perf_counter()
+        self.wall = None
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.totals[phase] += seconds
+
+    def add_call(self, record):
+        with self._lock:
+            self.calls.append({**self.tags, **record})
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.start
+        return self
+
+    def columns(self):
+        """CSV columns: <phase>_s per phase plus the trial's wall_s."""
+        cols = {f"{p}_s": round(v, 4) for p, v in self.totals.items()}
+        cols["wall_s"] = round(self.wall if self.wall is not None
+                               else time.perf_counter() - self.start, 4)
+        return cols
+
+
+def current():
+    """The active Recorder, or None."""
+    return _current.get()
+
+
+@contextmanager
+def recording(recorder):
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        recorder.stop()
+
+
+@contextmanager
+def span(phase):
+    """Time the block into *phase*; nested spans of the same phase count once."""
+    with tracing.span(phase, "phase"):
+        rec = _current.get()
+        if rec is None or phase in _open.get():
+            yield
+            return
+        token = _open.set(_open.get() | {phase})
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            rec.add(phase, time.perf_counter() - t0)
+            _open.reset(token)
+
+
+def timed(phase):
+    """Decorator form of `span`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None and not tracing.enabled():
+                return fn(*args, **kwargs)
+            with span(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def record_call(model, ttfb, total, usage, **extra):
+    """Add one LLM call (seconds) to the active recorder, if any."""
+    rec = _current.get()
+    if rec is None:
+        return
+    rec.add("llm_ttfb", ttfb)
+    rec.add("llm", total)
+    rec.add_call({
+        "model": model,
+        "ttfb_s": round(ttfb, 4),
+        "total_s": round(total, 4),
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        **extra,
+    })
+
@@ -0,0 +1,117 @@
+"""
+Token ledger: one entry per LLM call, priced.
+
+•  every call made through `llm` is recorded with its prompt and
+   completion tokens, model, and the current tags (planner, agent, round)
+•  `with tagged(agent=3, round=1):` adds tags for the calls inside it,
+   including calls fanned out through `llm.map_concurrent`
+•  `with recording(Ledger(...)):` collects the entries of one trial
+•  PRICES holds USD per million prompt / completion tokens;
+   `load_prices(path)` merges a JSON file of {"model": [prompt, completion]}
+
+Cached responses are recorded with cost 0; aborted streams are recorded
+with their estimated usage and `estimated: true`.
+"""
+
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+
+# USD per 1M tokens: (prompt, completion)
+PRICES = {
+    "gpt-4.1":       (2.00, 8.00),
+    "gpt-4.1-mini":  (0.40, 1.60),
+    "gpt-4o":        (2.50, 10.00),
+    "gpt-4o-mini":   (0.15, 0.60),
+    "gpt-4":         (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+_current = contextvars.ContextVar("ledger", default=None)
+_tags = contextvars.ContextVar("ledger_tags", default={})
+
+
+def load_prices(path):
+    """Merge a JSON price file ({"model": [prompt_usd, completion_usd]} per 1M tokens)."""
+    with open(path) as f:
+        for model, (prompt, completion) in json.load(f).items():
+            PRICES[model] = (float(prompt), float(completion))
+
+
+def price(model):
+    """(prompt, completion) USD per 1M tokens; dated snapshots fall back to their base model."""
+    if model in PRICES:
+        return PRICES[model]
+    base = max((m for m in PRICES if model.startswith(m + "-")), key=len, default=None)
+    return PRICES.get(base, (0.0, 0.0))
+
+
+def cost(model, prompt_tokens, completion_tokens):
+    p, c = price(model)
+    return (prompt_tokens * p + completion_tokens * c) / 1e6
+
+
+class Ledger:
+    """Entries of one run (e.g. one batch trial), tagged with *tags*."""
+
+    def __init__(self, **tags):
+        self.tags = tags
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+
+    def totals(self):
+        """prompt_tokens / completion_tokens / cost_usd summed over every entry."""
+        with self._lock:
+            entries = list(self.entries)
+        return {
+            "prompt_tokens":     sum(e["prompt_tokens"] for e in entries),
+            "completion_tokens": sum(e["completion_tokens"] for e in entries),
+            "cost_usd":          round(sum(e["cost_usd"] for e in entries), 6),
+        }
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def recording(ledger):
+    token = _current.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def tagged(**tags):
+    """Tag every call made inside the block (inner tags win)."""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def record(model, usage, cached=False, estimated=False):
+    """Add one call to the active ledger, if any."""
+    ledger = _current.get()
+    if ledger is None:
+        return
+    prompt = usage.get("prompt_tokens", 0)
+    completion = usage.get("completion_tokens", 0)
+    ledger.add({
+        **ledger.tags,
+        **_tags.get(),
+        "model": model,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "cost_usd": 0.0 if cached else round(cost(model, prompt, completion), 6),
+        "cached": cached,
+        "estimated": estimated,
+    })
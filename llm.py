@@ -0,0 +1,378 @@
+"""
+Shared LLM client for CMAS / DMAS / HMAS‑1 / HMAS‑2 / ETP.
+
+•  one pooled, keep‑alive HTTP client for every planner
+•  built lazily on the first call, so importing a planner opens nothing
+•  connection limits come from the environment or `configure()`:
+     LLM_MAX_CONNECTIONS  (default 20)
+     LLM_MAX_KEEPALIVE    (default 10)
+     LLM_TIMEOUT          (seconds, default 60)
+•  `complete(messages, model, **opts)` → (text, usage)
+•  opt‑in response cache for temperature‑0 calls (see llm_cache.py):
+     LLM_CACHE            path of the SQLite cache file (unset = off)
+     LLM_CACHE_MAX_MB     size limit before LRU eviction (default 256)
+     LLM_CACHE_BYPASS=1   keep the cache configured but skip it
+•  `stream(messages, model, **opts)` → StreamedCompletion, which can be
+   closed part‑way to stop paying for the rest of the generation
+•  every request goes through one shared rate limiter (see ratelimit.py):
+     LLM_RPM / LLM_TPM     requests / tokens per minute (unset = unlimited)
+     LLM_MAX_IN_FLIGHT     ceiling for the adaptive concurrency (default 16)
+     LLM_MAX_RETRIES       retries on 429 / 5xx / connection errors (default 5)
+•  `map_concurrent(fn, items)` fans independent calls out over a thread
+   pool capped at LLM_CONCURRENCY (default 8) and keeps input order
+•  every call is entered in the token ledger (see ledger.py) and reports
+   its time to first byte and total time to the active latency recorder
+   (see latency.py) and, if enabled, to the timeline (see tracing.py)
+•  inside `cassette.using(tape)` calls are recorded to, or replayed from,
+   a cassette (see cassette.py); a replayed call never leaves the process
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cassette
+import latency
+import ledger
+import llm_cache
+import ratelimit
+import tracing
+
+DEFAULT_MODEL = "gpt-4.1"
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+COMPLETION_ESTIMATE = 512   # tokens reserved for a reply when max_tokens is not set
+
+_settings = {
+    "max_connections": int(os.getenv("LLM_MAX_CONNECTIONS", 20)),
+    "max_keepalive":   int(os.getenv("LLM_MAX_KEEPALIVE", 10)),
+    "keepalive_expiry": 30.0,
+    "timeout":         float(os.getenv("LLM_TIMEOUT", 60)),
+    "base_url":        None,
+    "cache_path":      os.getenv("LLM_CACHE") or None,
+    "cache_max_mb":    float(os.getenv("LLM_CACHE_MAX_MB", 256)),
+    "cache_bypass":    os.getenv("LLM_CACHE_BYPASS", "") not in ("", "0"),
+    "rpm":             float(os.getenv("LLM_RPM", 0)),
+    "tpm":             float(os.getenv("LLM_TPM", 0)),
+    "max_in_flight":   int(os.getenv("LLM_MAX_IN_FLIGHT", 16)),
+    "max_retries":     int(os.getenv("LLM_MAX_RETRIES", 5)),
+}
+_client = None
+_cache = None
+_limiter = None
+_lock = threading.Lock()
+_stamp = threading.local()     # when the last response's headers arrived
+
+
+def configure(**settings):
+    """Override client / cache / limiter settings; takes effect on the next call."""
+    global _client, _cache, _limiter
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise TypeError(f"unknown llm settings: {sorted(unknown)}")
+    with _lock:
+        _settings.update(settings)
+        if _client is not None:
+            _client.close()
+            _client = None
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+        _limiter = None
+
+
+def settings():
+    """Copy of the current settings, e.g. to configure worker processes."""
+    with _lock:
+        return dict(_settings)
+
+
+def get_client():
+    """Return the shared OpenAI client, building it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import httpx
+                from dotenv import load_dotenv
+                from openai import OpenAI
+
+                load_dotenv()
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=_settings["max_connections"],
+                        max_keepalive_connections=_settings["max_keepalive"],
+                        keepalive_expiry=_settings["keepalive_expiry"],
+                    ),
+                    timeout=_settings["timeout"],
+                    event_hooks={"response": [_mark_first_byte]},
+                )
+                _client = OpenAI(
+                    # a local stand‑in (base_url) needs no real key
+                    api_key=os.getenv("OPENAI_API_KEY") or ("local" if _settings["base_url"] else None),
+                    base_url=_settings["base_url"],
+                    http_client=http_client,
+                    max_retries=0,          # retries belong to the shared limiter
+                )
+    return _client
+
+
+def get_limiter():
+    """Return the shared rate limiter, building it from the settings on first use."""
+    global _limiter
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                _limiter = ratelimit.Limiter(
+                    rpm=_settings["rpm"], tpm=_settings["tpm"],
+                    max_in_flight=_settings["max_in_flight"],
+                    max_retries=_settings["max_retries"],
+                )
+    return _limiter
+
+
+def _mark_first_byte(response):
+    _stamp.first_byte = time.perf_counter()
+
+
+def get_cache():
+    """Return the shared response cache, or None if caching is off."""
+    global _cache
+    if _cache is None and _settings["cache_path"]:
+        with _lock:
+            if _cache is None:
+                _cache = llm_cache.ResponseCache(
+                    _settings["cache_path"],
+                    max_bytes=int(_settings["cache_max_mb"] * 1024 * 1024),
+                    bypass=_settings["cache_bypass"],
+                )
+    return _cache
+
+
+def close():
+    """Close the pooled connections (the client is rebuilt on next use)."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    return {
+        "prompt_tokens":     usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens":      usage.total_tokens,
+    }
+
+
+def _report(model, t0, ttfb, total, usage, estimated=False, **extra):
+    """Hand one finished call to the token ledger, latency recorder and timeline."""
+    ledger.record(model, usage, cached=extra.get("cached", False), estimated=estimated)
+    latency.record_call(model, ttfb, total, usage, **extra)
+    if tracing.enabled():
+        tracing.add("llm", "llm", t0, total, {"model": model, **usage, **extra})
+        tracing.add("ttfb", "llm", t0, ttfb)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for text we have no usage for."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _reservation(messages, opts):
+    """Tokens a call is expected to use: prompt estimate plus its reply budget."""
+    prompt = estimate_tokens("".join(m["content"] for m in messages))
+    return prompt + (opts.get("max_tokens") or COMPLETION_ESTIMATE)
+
+
+def complete(messages, model=DEFAULT_MODEL, bypass_cache=False, **opts):
+    """
+    Send one chat completion and return (text, usage).
+
+    *usage* is a dict with prompt_tokens / completion_tokens / total_tokens.
+    Extra keyword arguments (temperature, max_tokens, …) go straight to the API.
+    Temperature‑0 calls are served from the response cache when one is
+    configured, unless *bypass_cache* is set.
+    """
+    t0 = time.perf_counter()
+    tape = cassette.current()
+    if tape is not None and tape.replaying:
+        # a call that was a cache hit when recorded stays free on replay
+        text, usage, flags = tape.replay(model, messages, opts)
+        elapsed = time.perf_counter() - t0
+        _report(model, t0, elapsed, elapsed, usage, streamed=False, replayed=True, **flags)
+        return text, usage
+
+    cache = get_cache()
+    key = None
+    if cache is not None and not bypass_cache and opts.get("temperature") == 0:
+        key = llm_cache.make_key(model, messages, opts)
+        hit = cache.get(key)
+        if hit is not None:
+            elapsed = time.perf_counter() - t0
+            _report(model, t0, elapsed, elapsed, hit[1], cached=True, streamed=False)
+            if tape is not None:
+                tape.record(model, messages, opts, *hit, cached=True)
+            return hit
+
+    _stamp.first_byte = None
+    response = get_limiter().call(
+        lambda: get_client().chat.completions.create(model=model, messages=messages, **opts),
+        _reservation(messages, opts),
+        lambda r: r.usage.total_tokens if r.usage else None)
+    total = time.perf_counter() - t0
+    ttfb = _stamp.first_byte - t0 if _stamp.first_byte else total
+    text = response.choices[0].message.content or ""
+    usage = _usage_dict(response.usage)
+    _report(model, t0, ttfb, total, usage, cached=False, streamed=False)
+    if key is not None:
+        cache.put(key, text, usage)
+    if tape is not None:
+        tape.record(model, messages, opts, text, usage)
+    return text, usage
+
+
+class StreamedCompletion:
+    """
+    A streamed chat completion. Iterate it for text chunks; `text` and
+    `usage` fill in as it runs. `close()` stops the generation early, in
+    which case `usage` is estimated from what arrived (`estimated` = True).
+    """
+
+    def __init__(self, messages, model, bypass_cache, opts):
+        self.messages = messages
+        self.model = model
+        self.opts = opts
+        self.text = ""
+        self.usage = None
+        self.estimated = False
+        self.aborted = False
+        self._response = None
+        self._chunks = 0
+        self._cached = None
+        self._key = None
+        self._t0 = time.perf_counter()
+        self._ttfb = None
+        self._recorded = False
+        self._reserved = _reservation(messages, opts)
+        self._tape = cassette.current()
+        self._replayed = self._tape is not None and self._tape.replaying
+        self._holding = False
+
+        cache = get_cache()
+        if self._replayed:
+            text, usage, self._flags = self._tape.replay(model, messages, opts)
+            self._cached = text, usage
+        elif cache is not None and not bypass_cache and opts.get("temperature") == 0:
+            self._key = llm_cache.make_key(model, messages, opts)
+            self._cached = cache.get(self._key)
+        if self._cached is None:
+            # the stream holds its in‑flight slot until it ends or is aborted;
+            # usage is settled and the slot freed in _record / _release
+            self._response = get_limiter().call(
+                lambda: get_client().chat.completions.create(
+                    model=model, messages=messages, stream=True,
+                    stream_options={"include_usage": True}, **opts),
+                self._reserved, hold=True)
+            self._holding = True
+
+    def __iter__(self):
+        if self._cached is not None:
+            self.text, self.usage = self._cached
+            if self._replayed:
+                self.estimated = self._flags["estimated"]
+                self._record(cached=self._flags["cached"])
+            else:
+                self._record(cached=True)
+            yield self.text
+            return
+        try:
+            for event in self._response:
+                if event.usage is not None:
+                    self.usage = _usage_dict(event.usage)
+                if event.choices:
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        if self._ttfb is None:
+                            self._ttfb = time.perf_counter() - self._t0
+                        self.text += delta
+                        self._chunks += 1
+                        yield delta
+                if self.aborted:
+                    return
+            if self.usage is None:
+                self._estimate_usage()
+            elif self._key is not None:
+                get_cache().put(self._key, self.text, self.usage)
+            self._record()
+        finally:
+            # a stream that errors or is abandoned mid‑way still frees its slot
+            self._release()
+
+    def close(self):
+        """Abort the generation; the server stops once the connection drops."""
+        if self.aborted or self._response is None:
+            return
+        self.aborted = True
+        self._response.close()
+        if self.usage is None:
+            self._estimate_usage()
+        self._record()
+
+    def _record(self, cached=False):
+        if self._recorded:
+            return
+        self._recorded = True
+        total = time.perf_counter() - self._t0
+        extra = {"replayed": True} if self._replayed else {}
+        if not cached and not self._replayed:
+            get_limiter().settle((self.usage or {}).get("total_tokens", 0), self._reserved)
+        _report(self.model, self._t0, total if self._ttfb is None else self._ttfb, total,
+                self.usage or {}, estimated=self.estimated, cached=cached, streamed=True,
+                aborted=self.aborted, **extra)
+        if self._tape is not None:
+            self._tape.record(self.model, self.messages, self.opts, self.text, self.usage or {},
+                              cached=cached, estimated=self.estimated)
+        self._release()
+
+    def _release(self):
+        if self._holding:
+            self._holding = False
+            get_limiter().release()
+
+    def __del__(self):
+        # opened but never iterated or closed
+        if getattr(self, "_holding", False):
+            self._release()
+
+    def _estimate_usage(self):
+        prompt = estimate_tokens("".join(m["content"] for m in self.messages))
+        self.usage = {"prompt_tokens": prompt,
+                      "completion_tokens": self._chunks,   # ~1 token per delta
+                      "total_tokens": prompt + self._chunks}
+        self.estimated = True
+
+
+def stream(messages, model=DEFAULT_MODEL, bypass_cache=False, **opts):
+    """Start a streamed completion (see StreamedCompletion)."""
+    return StreamedCompletion(messages, model, bypass_cache, opts)
+
+
+def map_concurrent(fn, items, max_workers=None):
+    """
+    Apply *fn* to every item, running up to *max_workers* calls at once.
+    Results come back in the order of *items*; ``max_workers=1`` runs inline.
+    Each call runs in a copy of the caller's context, so the active latency
+    recorder follows it onto the pool threads.
+    """
+    items = list(items)
+    workers = min(max_workers or DEFAULT_CONCURRENCY, len(items))
+    if workers <= 1:
+        return [fn(item) for item in items]
+    contexts = [contextvars.copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda ctx, item: ctx.run(fn, item), contexts, items))
@@ -0,0 +1,129 @@
+"""
+Content‑addressed on‑disk cache for deterministic (temperature‑0) LLM calls.
+
+•  key    = sha256 of model + messages + sampling params
+•  store  = one SQLite file, indexed on the key and on last‑use time
+•  evicts least‑recently‑used entries once the file exceeds `max_bytes`
+•  `hits` / `misses` counters; `bypass = True` skips reads and writes
+•  `recording()` also counts the block's hits / misses in a dict of its
+   own, so a trial run in a worker process can report them to the parent
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key       TEXT PRIMARY KEY,
+    text      TEXT NOT NULL,
+    usage     TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used);
+"""
+
+
+def make_key(model, messages, opts):
+    payload = json.dumps({"model": model, "messages": messages, "opts": opts},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_current = contextvars.ContextVar("cache_counts", default=None)
+
+
+@contextmanager
+def recording():
+    """Count the block's cache hits / misses in a fresh dict (yielded)."""
+    counts = {"hits": 0, "misses": 0}
+    token = _current.set(counts)
+    try:
+        yield counts
+    finally:
+        _current.reset(token)
+
+
+def _count(outcome):
+    counts = _current.get()
+    if counts is not None:
+        counts[outcome] += 1
+
+
+class ResponseCache:
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, bypass=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def get(self, key):
+        """Return (text, usage) for *key*, or None on a miss."""
+        if self.bypass:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text, usage FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                _count("misses")
+                return None
+            self._db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            _count("hits")
+        text, usage = row
+        return text, json.loads(usage)
+
+    def put(self, key, text, usage):
+        if self.bypass:
+            return
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, text, usage, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, json.dumps(usage), size, time.time()))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
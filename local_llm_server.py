@@ -0,0 +1,348 @@
+"""
+Local OpenAI‑compatible stand‑in for load‑testing the planners offline.
+
+    python local_llm_server.py --port 8765 --latency lognormal:400,0.5 --rate-429 0.05
+    python batch_testing.py -n 10 --workers 8 --base-url http://127.0.0.1:8765/v1
+
+Implements POST /v1/chat/completions (plain and streamed, incl. the
+final usage chunk) and GET /v1/models. Replies come from
+
+•  recorded transcripts: an llm_cache SQLite file (exact request match)
+   or a JSONL file of {"prompt": last user message, "response": text}
+•  otherwise a rule‑based BoxNet solver that reads the board from the
+   prompt (centralised planners get a full plan, HMAS‑1 reviewers echo
+   their lines, HMAS‑2 reviewers agree, DMAS agents do nothing)
+
+Latency, fault injection and token counts are configurable:
+  --latency      fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN   (ms)
+  --ttfb-share   fraction of the latency spent before the first byte
+  --rate-429 / --rate-500  probability of answering with that error
+  --retry-after  seconds sent with 429s
+  --prompt-tokens / --completion-tokens  fixed usage instead of estimates
+
+`serve(...)` starts the same server on a background thread for scripts.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import llm
+import llm_cache
+import structured_output
+from plan_parser import Action, format_action, parse_plan
+
+_PAIR = r"\(\s*(\d+)\s*,\s*(\d+)\s*\)"
+_BOX_RE = re.compile(rf"-\s*(\w+) box at {_PAIR}, goal at (.*)")
+_AGENT_AT_RE = re.compile(rf"-\s*Agent (\d+) at {_PAIR}")
+_AGENT_CELLS_RE = re.compile(r"-\s*Agent (\d+) responsible for cells (\[.*\])")
+_DELTAS = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+
+# ────────────────────────────────────────────────────────────
+#  Rule‑based BoxNet solver
+# ────────────────────────────────────────────────────────────
+def _pairs(text):
+    return [(int(r), int(c)) for r, c in re.findall(_PAIR, text)]
+
+
+def _route(start, goal):
+    """Cells visited moving rows first, then columns: [(from, direction), ...]."""
+    steps, (r, c) = [], start
+    while (r, c) != goal:
+        if r != goal[0]:
+            d = "down" if goal[0] > r else "up"
+        else:
+            d = "right" if goal[1] > c else "left"
+        steps.append(((r, c), d))
+        r, c = r + _DELTAS[d][0], c + _DELTAS[d][1]
+    return steps
+
+
+def solve_board(prompt):
+    """A full plan for a centralised BoxNet prompt, or None if it has no board."""
+    boxes = [(m.group(1), (int(m.group(2)), int(m.group(3))), _pairs(m.group(4)))
+             for m in _BOX_RE.finditer(prompt)]
+    if not boxes:
+        return None
+    at = {(int(r), int(c)): int(i) for i, r, c in _AGENT_AT_RE.findall(prompt)}
+    corners = {int(i): set(_pairs(cells)) for i, cells in _AGENT_CELLS_RE.findall(prompt)}
+
+    def mover(frm, to):
+        if frm in at:                      # BoxNet1: the agent in the box's cell
+            return at[frm]
+        for aid, cs in sorted(corners.items()):
+            if frm in cs and to in cs:     # BoxNet2: an agent owning both corners
+                return aid
+        return 0
+
+    actions, cleared = [], set()
+    for color, pos, goals in boxes:
+        if color in cleared or not goals:
+            continue
+        goal = min(goals, key=lambda g: abs(g[0] - pos[0]) + abs(g[1] - pos[1]))
+        route = _route(pos, goal)
+        for frm, d in route:
+            to = (frm[0] + _DELTAS[d][0], frm[1] + _DELTAS[d][1])
+            actions.append(Action(mover(frm, to), color, frm, d))
+        if corners:
+            # BoxNet2 clears a colour once a box lands on a goal corner;
+            # a box that already sits on one needs the explicit goal action
+            if not route:
+                actions.append(Action(mover(pos, pos), color, None, "goal"))
+            cleared.add(color)
+    return actions
+
+
+def solve(prompt):
+    """Reply text of the rule‑based solver for any planner prompt."""
+    actions = solve_board(prompt)
+    if actions is not None:
+        return "\n".join(format_action(a) for a in actions) or "- Agent 0: do nothing"
+    if "'agree'" in prompt:                # HMAS‑2 feedback
+        return "agree"
+    me = re.search(r"You are Agent (\d+)", prompt)
+    aid = int(me.group(1)) if me else 0
+    if "proposed plan from the central planner" in prompt:   # HMAS‑1 review
+        own = [a for a in parse_plan(prompt) if a.agent_id == aid]
+        if own:
+            return "\n".join(format_action(a) for a in own)
+    return f"- Agent {aid}: do nothing"
+
+
+# ────────────────────────────────────────────────────────────
+#  Transcripts, latency, faults
+# ────────────────────────────────────────────────────────────
+class Transcripts:
+    """Recorded replies from an llm_cache SQLite file or a prompt → response JSONL."""
+
+    def __init__(self, path):
+        self.cache = None
+        self.by_prompt = {}
+        if path.endswith(".jsonl"):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        prompt = rec.get("prompt") or rec["messages"][-1]["content"]
+                        self.by_prompt[prompt] = rec["response"]
+        else:
+            self.cache = llm_cache.ResponseCache(path)
+
+    def lookup(self, body):
+        messages = body.get("messages", [])
+        if self.cache is not None:
+            opts = {k: v for k, v in body.items()
+                    if k not in ("model", "messages", "stream", "stream_options")}
+            hit = self.cache.get(llm_cache.make_key(body.get("model"), messages, opts))
+            if hit is not None:
+                return hit[0]
+        return self.by_prompt.get(messages[-1]["content"]) if messages else None
+
+
+def latency_sampler(spec, rng):
+    """Seconds‑returning sampler for fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN."""
+    kind, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v] if args else []
+    if kind == "fixed":
+        return lambda: vals[0] / 1000.0
+    if kind == "uniform":
+        return lambda: rng.uniform(vals[0], vals[1]) / 1000.0
+    if kind == "lognormal":
+        mu = math.log(vals[0])
+        return lambda: rng.lognormvariate(mu, vals[1]) / 1000.0
+    if kind == "exp":
+        return lambda: rng.expovariate(1.0 / vals[0]) / 1000.0
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+class Config:
+    def __init__(self, latency="fixed:0", ttfb_share=0.5, rate_429=0.0, rate_500=0.0,
+                 retry_after=1.0, prompt_tokens=None, completion_tokens=None,
+                 transcripts=None, seed=None):
+        self.rng = random.Random(seed)
+        self.sample_latency = latency_sampler(latency, self.rng)
+        self.ttfb_share = ttfb_share
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.retry_after = retry_after
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.transcripts = Transcripts(transcripts) if transcripts else None
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "429": 0, "500": 0, "transcript": 0, "solver": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def draw(self):
+        """(fault status or None, latency seconds) for one request."""
+        with self.lock:
+            r = self.rng.random()
+            delay = self.sample_latency()
+        if r < self.rate_429:
+            return 429, delay
+        if r < self.rate_429 + self.rate_500:
+            return 500, delay
+        return None, delay
+
+
+# ────────────────────────────────────────────────────────────
+#  HTTP
+# ────────────────────────────────────────────────────────────
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None   # set by make_server
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status, payload, headers=()):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [
+                {"id": m, "object": "model", "owned_by": "local"} for m in ("gpt-4", "gpt-4.1")]})
+        else:
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        cfg = self.config
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        cfg.count("requests")
+
+        fault, delay = cfg.draw()
+        if fault == 429:
+            cfg.count("429")
+            time.sleep(delay * cfg.ttfb_share)
+            self._json(429, {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_error"}},
+                       headers=[("Retry-After", str(cfg.retry_after))])
+            return
+        if fault == 500:
+            cfg.count("500")
+            time.sleep(delay * cfg.ttfb_share)
+            self._json(500, {"error": {"message": "Internal error (injected)", "type": "server_error"}})
+            return
+
+        text = cfg.transcripts.lookup(body) if cfg.transcripts else None
+        if text is not None:
+            cfg.count("transcript")
+        else:
+            cfg.count("solver")
+            messages = body.get("messages", [])
+            text = solve(messages[-1]["content"] if messages else "")
+            # structured mode: a response_format, or only the format instructions
+            # for models without one (see structured_output.response_format)
+            if ((body.get("response_format") or {}).get("type") in ("json_schema", "json_object")
+                    or messages and messages[-1]["content"].endswith(structured_output.INSTRUCTIONS)):
+                text = structured_output.to_json(parse_plan(text))
+
+        prompt = "".join(m.get("content") or "" for m in body.get("messages", []))
+        p_tok = cfg.prompt_tokens if cfg.prompt_tokens is not None else llm.estimate_tokens(prompt)
+        c_tok = cfg.completion_tokens if cfg.completion_tokens is not None else llm.estimate_tokens(text)
+        usage = {"prompt_tokens": p_tok, "completion_tokens": c_tok, "total_tokens": p_tok + c_tok}
+        model = body.get("model", "gpt-4.1")
+        cid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        time.sleep(delay * cfg.ttfb_share)
+        if body.get("stream"):
+            self._stream(cid, model, text, usage, delay * (1 - cfg.ttfb_share),
+                         (body.get("stream_options") or {}).get("include_usage"))
+            return
+        time.sleep(delay * (1 - cfg.ttfb_share))
+        self._json(200, {
+            "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, cid, model, text, usage, rest, include_usage):
+        """Server‑sent events, one line of the reply per chunk, spread over *rest* s."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices, **extra):
+            chunk = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, **extra}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        pieces = re.findall(r"[^\n]*\n|[^\n]+$", text) or [""]
+        try:
+            for i, piece in enumerate(pieces):
+                delta = {"content": piece}
+                if i == 0:
+                    delta["role"] = "assistant"
+                event([{"index": 0, "delta": delta, "finish_reason": None}])
+                time.sleep(rest / len(pieces))
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                event([], usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # the client aborted the stream
+
+
+def make_server(host="127.0.0.1", port=8765, **config):
+    handler = type("BoundHandler", (Handler,), {"config": Config(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host="127.0.0.1", port=0, **config):
+    """Start the server on a background thread; returns (server, base_url)."""
+    server = make_server(host, port, **config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", default="fixed:0", help="per‑request latency distribution (ms)")
+    ap.add_argument("--ttfb-share", type=float, default=0.5)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--rate-500", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--prompt-tokens", type=int)
+    ap.add_argument("--completion-tokens", type=int)
+    ap.add_argument("--transcripts", metavar="PATH", help="llm_cache .sqlite file or prompt/response .jsonl")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+    srv = make_server(args.host, args.port, latency=args.latency, ttfb_share=args.ttfb_share,
+                      rate_429=args.rate_429, rate_500=args.rate_500, retry_after=args.retry_after,
+                      prompt_tokens=args.prompt_tokens, completion_tokens=args.completion_tokens,
+                      transcripts=args.transcripts, seed=args.seed)
+    print(f"Serving /v1/chat/completions on http://{args.host}:{srv.server_address[1]}/v1")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(srv.RequestHandlerClass.config.counts)
+        srv.server_close()
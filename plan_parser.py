@@ -0,0 +1,135 @@
+"""
+One parser for every planner's free‑text plan.
+
+Understands, case‑insensitively and with any spacing:
+    - Agent [id]: move [color] box from (x, y) to (new x, new y) [direction]
+    - Agent [id]: move [color] box to goal
+    - Agent [id]: do nothing
+The direction may be omitted when the target cell is given; it is then
+derived from the move itself. Each action comes back as an `Action`, a
+NamedTuple that still unpacks as (agent_id, color, from_pos, direction).
+
+`parse_plan(text)` parses a whole reply; `PlanStream.feed(chunk)` returns
+actions as soon as their line is complete, for streamed replies.
+`format_action(action)` renders an Action back into the canonical line.
+"""
+
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+import latency
+
+
+class Action(NamedTuple):
+    agent_id: int
+    color: str                          # "none" for do‑nothing
+    from_pos: Optional[Tuple[int, int]]  # None for goal / do‑nothing
+    direction: Optional[str]            # up/down/left/right, "goal" or "stay"
+
+
+_ACTION_RE = re.compile(r"""
+    (?:agent\s*(?P<aid>\d+)\s*:?\s*)?
+    (?:
+        move\s+(?:the\s+)?(?P<color>\w+)\s+box\s+
+        (?:
+            to\s+(?:the\s+|its\s+)?goal
+          | from\s*\(\s*(?P<r1>\d+)\s*,\s*(?P<c1>\d+)\s*\)
+            (?:\s*to\s*(?:cell\s*)?\(\s*(?P<r2>\d+)\s*,\s*(?P<c2>\d+)\s*\))?
+            (?:\s*[\[(]?\s*(?P<dir>up|down|left|right)\b)?
+        )
+      | (?P<nothing>do\s+nothing)
+    )
+""", re.I | re.X)
+
+_DELTA_DIRECTION = {(-1, 0): "up", (1, 0): "down", (0, -1): "left", (0, 1): "right"}
+DIRECTION_DELTA = {d: delta for delta, d in _DELTA_DIRECTION.items()}
+
+
+def parse_line(line: str, default_agent: Optional[int] = None) -> Optional[Action]:
+    """
+    Parse one line into an Action, or None if it holds no action.
+    Lines without an "Agent N:" prefix are skipped unless *default_agent*
+    is given.
+    """
+    m = _ACTION_RE.search(line)
+    if m is None:
+        return None
+    aid = m.group("aid")
+    if aid is None:
+        if default_agent is None:
+            return None
+        agent_id = default_agent
+    else:
+        agent_id = int(aid)
+
+    if m.group("nothing"):
+        return Action(agent_id, "none", None, "stay")
+
+    color = m.group("color").lower()
+    if m.group("r1") is None:
+        return Action(agent_id, color, None, "goal")
+
+    from_pos = (int(m.group("r1")), int(m.group("c1")))
+    direction = m.group("dir")
+    if direction:
+        direction = direction.lower()
+    elif m.group("r2") is not None:
+        delta = (int(m.group("r2")) - from_pos[0], int(m.group("c2")) - from_pos[1])
+        direction = _DELTA_DIRECTION.get(delta)
+    return Action(agent_id, color, from_pos, direction)
+
+
+@latency.timed("parse")
+def parse_plan(text: str, default_agent: Optional[int] = None) -> List[Action]:
+    """Parse every action line of a reply, in order."""
+    actions = []
+    for line in text.splitlines():
+        act = parse_line(line, default_agent)
+        if act is not None:
+            actions.append(act)
+    return actions
+
+
+def format_action(action) -> str:
+    """Canonical "- Agent N: ..." line for an action."""
+    agent_id, color, from_pos, direction = action
+    if color == "none":
+        return f"- Agent {agent_id}: do nothing"
+    if direction == "goal":
+        return f"- Agent {agent_id}: move {color} box to goal"
+    r, c = from_pos
+    if direction not in DIRECTION_DELTA:
+        return f"- Agent {agent_id}: move {color} box from ({r}, {c})"
+    dr, dc = DIRECTION_DELTA[direction]
+    return f"- Agent {agent_id}: move {color} box from ({r}, {c}) to ({r + dr}, {c + dc}) {direction}"
+
+
+class PlanStream:
+    """Incremental parser: feed reply chunks, get actions per finished line."""
+
+    def __init__(self, default_agent: Optional[int] = None):
+        self.default_agent = default_agent
+        self.actions: List[Action] = []
+        self._buf = ""
+
+    def feed(self, chunk: str) -> List[Action]:
+        """Add a chunk; return the actions of any lines it completed."""
+        self._buf += chunk
+        if "\n" not in self._buf:
+            return []
+        *lines, self._buf = self._buf.split("\n")
+        return self._parse(lines)
+
+    def close(self) -> List[Action]:
+        """Flush the last, unterminated line."""
+        lines, self._buf = [self._buf], ""
+        return self._parse(lines)
+
+    def _parse(self, lines):
+        new = []
+        for line in lines:
+            act = parse_line(line, self.default_agent)
+            if act is not None:
+                new.append(act)
+        self.actions.extend(new)
+        return new
@@ -0,0 +1,237 @@
+"""
+Shared rate limiter for LLM calls.
+
+•  token buckets for requests/min and tokens/min; a call reserves its
+   prompt‑token estimate plus the expected completion before it is sent,
+   and the reservation is settled against the real usage afterwards
+•  retries 429 / 5xx / connection errors with full‑jitter exponential
+   backoff, or exactly the server's Retry‑After when it sends one
+•  AIMD concurrency: the number of calls in flight grows by ~1 per window
+   of successes and halves on a 429 / 5xx (at most once per cooldown); a
+   streamed call stays in flight until its stream ends
+
+llm.py builds one Limiter per process from its settings (LLM_RPM,
+LLM_TPM, LLM_MAX_RETRIES); every planner goes through it. `recording()`
+counts the retries, 429s and give‑ups of a block (e.g. one trial) in a
+dict of its own, so a worker process can report them to the parent.
+"""
+
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("limiter_counts", default=None)
+
+
+@contextmanager
+def recording():
+    """Count the block's calls, retries and failures in a fresh dict (yielded)."""
+    counts = dict.fromkeys(("calls", "retries", "rate_limit", "server", "connection", "failed"), 0)
+    token = _current.set(counts)
+    try:
+        yield counts
+    finally:
+        _current.reset(token)
+
+
+class TokenBucket:
+    """*rate* units per minute, bursting up to one minute's worth."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.capacity = float(rate)
+        self.tokens = float(rate)
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate / 60.0)
+        self.stamp = now
+
+    def acquire(self, n=1):
+        """Block until *n* units are available and take them."""
+        n = min(float(n), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) * 60.0 / self.rate
+            time.sleep(wait)
+
+    def settle(self, n):
+        """Take *n* more units (or give back -n) without waiting; may go into debt."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - n)
+
+
+class AdaptiveGate:
+    """A semaphore whose limit follows AIMD between *min_limit* and *max_limit*."""
+
+    def __init__(self, max_limit, min_limit=1, cooldown=1.0):
+        self.limit = float(max_limit)
+        self.max_limit = float(max_limit)
+        self.min_limit = float(min_limit)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_overload(self):
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_cut >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_cut = now
+
+
+def classify(exc):
+    """'rate_limit', 'server' or 'connection' for retryable errors, else None."""
+    status = getattr(exc, "status_code", None)
+    if status == 429:
+        return "rate_limit"
+    if status is not None and status >= 500:
+        return "server"
+    if type(exc).__name__ in ("APIConnectionError", "APITimeoutError",
+                              "ConnectError", "ReadTimeout", "RemoteProtocolError"):
+        return "connection"
+    return None
+
+
+def retry_after(exc):
+    """Seconds the server asked us to wait (Retry‑After / retry‑after‑ms), or None."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        import email.utils          # HTTP‑date form only; costs ~15 ms to import
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None             # malformed: fall back to jittered backoff
+        return max(0.0, when.timestamp() - time.time()) if when else None
+
+
+class Limiter:
+    """
+    rpm / tpm         – requests and tokens per minute (0 = unlimited)
+    max_in_flight     – AIMD ceiling for concurrent calls
+    max_retries       – retries of one call before the error is raised
+    base_delay / max_delay – backoff range in seconds
+    """
+
+    def __init__(self, rpm=0, tpm=0, max_in_flight=16, max_retries=5,
+                 base_delay=0.5, max_delay=30.0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.gate = AdaptiveGate(max_in_flight)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._counts = {"calls": 0, "retries": 0, "rate_limit": 0, "server": 0,
+                        "connection": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        counts = _current.get()
+        with self._lock:
+            self._counts[key] += 1
+            if counts is not None:
+                counts[key] += 1
+
+    def backoff(self, attempt, exc=None):
+        """Delay before retry *attempt* (0‑based): Retry‑After, else full jitter."""
+        hinted = retry_after(exc) if exc is not None else None
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, estimate, usage_of=None, hold=False):
+        """
+        Run *fn()* under the limits, reserving *estimate* tokens first.
+        *usage_of(result)* returns the real total tokens to settle the
+        reservation (None keeps the estimate). With *hold* a successful
+        call keeps its in‑flight slot until `release()` – a stream is still
+        running when *fn* returns.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            if self.requests:
+                self.requests.acquire(1)
+            if self.tokens:
+                self.tokens.acquire(estimate)
+            self.gate.acquire()
+            try:
+                result = fn()
+            except Exception as exc:
+                self.gate.release()
+                self.settle(0, estimate)      # a rejected call spends nothing
+                kind = classify(exc)
+                if kind in ("rate_limit", "server"):
+                    self.gate.on_overload()
+                if kind is None or attempt >= self.max_retries:
+                    if kind is not None:
+                        self._count("failed")
+                    raise
+                self._count(kind)
+                self._count("retries")
+                delay = self.backoff(attempt, exc)
+                attempt += 1
+            else:
+                if not hold:
+                    self.gate.release()
+                self.gate.on_success()
+                used = usage_of(result) if usage_of is not None else None
+                if used is not None:
+                    self.settle(used, estimate)
+                return result
+            time.sleep(delay)
+
+    def release(self):
+        """Free the in‑flight slot of a call made with hold=True."""
+        self.gate.release()
+
+    def settle(self, used, estimate):
+        """Correct a call's token reservation once its real usage is known."""
+        if self.tokens:
+            self.tokens.settle(used - estimate)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counts)
+        out["in_flight_limit"] = round(self.gate.limit, 1)
+        return out
@@ -0,0 +1,215 @@
+"""
+Seeded BoxNet1 / BoxNet2 scenarios of any size.
+
+•  `generate(kind, rows, cols, boxes=None, colors=None, seed=0)` builds a
+   BoxNet1 ("boxnet1": rows × cols cells, one agent per cell) or BoxNet2
+   ("boxnet2": rows × cols corners, one agent per cell) instance with
+   random box positions and goal layouts
+•  every instance is checked by executing `reference_plan(env)` on a copy;
+   an instance whose plan does not reach every goal is never returned
+•  `Scenario` is a picklable env factory for batch_testing (one instance
+   per trial seed); `parse_set(spec)` reads `--scenario-set`, either a name
+   from SETS or comma‑separated `kind:ROWSxCOLS[:BOXES[:COLORS]]`
+
+Box counts default to the density of the original boards (5 boxes per 8
+agents); BoxNet1 defaults to 3 colours, BoxNet2 has one box per colour.
+"""
+
+import copy
+import random
+from typing import NamedTuple, Optional
+
+import executor
+from convergence import goals_reached
+from BoxNet1 import Box as Box1, BoxNet1
+from BoxNet2_test import Box as Box2, BoxNet2
+from plan_parser import Action, DIRECTION_DELTA
+
+PALETTE = ["blue", "yellow", "red", "purple", "green", "orange", "pink", "cyan",
+           "brown", "gray", "black", "white", "olive", "navy", "teal", "maroon"]
+
+SETS = {
+    # 8 → 256 agents
+    "scale":  "boxnet1:2x4,boxnet1:4x8,boxnet1:8x8,boxnet1:16x16,"
+              "boxnet2:3x5,boxnet2:5x9,boxnet2:9x9,boxnet2:17x17",
+    "small":  "boxnet1:2x4,boxnet1:4x4,boxnet2:3x5,boxnet2:4x5",
+}
+
+
+def color_names(n):
+    """*n* distinct colour names: the palette, then blue2, yellow2, …"""
+    return [PALETTE[i % len(PALETTE)] + (str(i // len(PALETTE) + 1) if i >= len(PALETTE) else "")
+            for i in range(n)]
+
+
+def _route(start, goal):
+    """[(from, direction), ...] moving rows first, then columns."""
+    steps, (r, c) = [], start
+    while (r, c) != goal:
+        if r != goal[0]:
+            d = "down" if goal[0] > r else "up"
+        else:
+            d = "right" if goal[1] > c else "left"
+        steps.append(((r, c), d))
+        r, c = r + DIRECTION_DELTA[d][0], c + DIRECTION_DELTA[d][1]
+    return steps
+
+
+def _distance(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def reference_plan(env):
+    """A plan that reaches every goal of a BoxNet1 / BoxNet2 env."""
+    rows, cols = executor.grid_shape(env)
+    actions = []
+    if isinstance(env, BoxNet2):
+        def mover(frm, to):
+            r = min(frm[0], to[0], rows - 2)
+            c = min(frm[1], to[1], cols - 2)
+            return r * (cols - 1) + c
+
+        for box in env.boxes:
+            goals = env.goals.get(box.color)
+            if not goals or not box.positions:
+                continue
+            pos = box.positions[0]
+            # the nearest goal corner: no corner on the way to it is a goal,
+            # so the box is not cleared part‑way along its route
+            goal = min(goals, key=lambda g: _distance(pos, g))
+            route = _route(pos, goal)
+            for frm, d in route:
+                to = (frm[0] + DIRECTION_DELTA[d][0], frm[1] + DIRECTION_DELTA[d][1])
+                actions.append(Action(mover(frm, to), box.color, frm, d))
+            if not route:
+                actions.append(Action(mover(pos, pos), box.color, None, "goal"))
+        return actions
+
+    for box in env.boxes:
+        free = list(env.goals.get(box.color, []))
+        for pos in box.positions:
+            if not free:
+                break
+            goal = min(free, key=lambda g: _distance(pos, g))
+            free.remove(goal)
+            for frm, d in _route(pos, goal):
+                actions.append(Action(frm[0] * cols + frm[1], box.color, frm, d))
+    return actions
+
+
+def _boxnet1(rng, rows, cols, boxes, colors):
+    cells = [(r, c) for r in range(rows) for c in range(cols)]
+    if boxes is None:
+        boxes = max(1, round(rows * cols * 5 / 8))
+    colors = min(colors or 3, boxes)
+    counts = [boxes // colors + (i < boxes % colors) for i in range(colors)]
+    if max(counts) > len(cells):
+        raise ValueError(f"{boxes} boxes in {colors} colours need more than {rows}×{cols} cells")
+    box_list, goals = [], {}
+    for name, n in zip(color_names(colors), counts):
+        box_list.append(Box1(name, [rng.choice(cells) for _ in range(n)]))
+        goals[name] = rng.sample(cells, n)
+    return BoxNet1(rows, cols, box_list, goals)
+
+
+def _boxnet2(rng, rows, cols, boxes, colors):
+    if rows < 2 or cols < 2:
+        raise ValueError("a BoxNet2 board needs at least 2×2 corners")
+    cells = [(r, c) for r in range(rows - 1) for c in range(cols - 1)]
+    corners = [(r, c) for r in range(rows) for c in range(cols)]
+    if boxes is None:
+        boxes = max(1, round(len(cells) * 5 / 8))
+    if colors not in (None, boxes):
+        raise ValueError("BoxNet2 clears a colour at once, so it has one box per colour")
+    box_list, goals = [], {}
+    for name in color_names(boxes):
+        r, c = rng.choice(cells)
+        goal = [(r, c), (r, c + 1), (r + 1, c), (r + 1, c + 1)]
+        starts = [p for p in corners if p not in goal] or corners
+        box_list.append(Box2(name, [rng.choice(starts)]))
+        goals[name] = goal
+    return BoxNet2(rows, cols, box_list, goals)
+
+
+def generate(kind, rows, cols, boxes=None, colors=None, seed=0):
+    """A solvable `kind` ("boxnet1" / "boxnet2") instance; the same seed gives the same board."""
+    build = {"boxnet1": _boxnet1, "boxnet2": _boxnet2}[kind.lower()]
+    env = build(random.Random(seed), rows, cols, boxes, colors)
+    check = copy.deepcopy(env)
+    executor.execute_plan(check, reference_plan(check))
+    if not goals_reached(check):
+        raise AssertionError(f"generated {kind} {rows}x{cols} (seed {seed}) is not solvable")
+    return env
+
+
+class Scenario(NamedTuple):
+    """Env factory for one scenario size; called with the trial number as seed."""
+    kind: str
+    rows: int
+    cols: int
+    boxes: Optional[int] = None
+    colors: Optional[int] = None
+
+    @property
+    def name(self):
+        label = "BoxNet1" if self.kind == "boxnet1" else "BoxNet2"
+        extra = "".join(f"-{k[0]}{v}" for k, v in (("boxes", self.boxes), ("colors", self.colors)) if v)
+        return f"{label}-{self.rows}x{self.cols}{extra}"
+
+    def __call__(self, seed=0):
+        return generate(self.kind, self.rows, self.cols, self.boxes, self.colors, seed)
+
+    @property
+    def spec(self):
+        """The `kind:ROWSxCOLS[:BOXES[:COLORS]]` item that parses back to this scenario."""
+        counts = [self.boxes, self.colors] if self.colors else [self.boxes] if self.boxes else []
+        return ":".join([self.kind, f"{self.rows}x{self.cols}"] + [str(n or "") for n in counts])
+
+    @classmethod
+    def from_name(cls, name):
+        """The Scenario whose `.name` is *name*, or None for any other name."""
+        label, _, rest = name.partition("-")
+        if label not in ("BoxNet1", "BoxNet2") or not rest:
+            return None
+        size, *extra = rest.split("-")
+        try:
+            rows, cols = (int(v) for v in size.split("x"))
+            counts = {part[0]: int(part[1:]) for part in extra}
+        except ValueError:
+            return None
+        if set(counts) - {"b", "c"}:
+            return None
+        return cls(label.lower(), rows, cols, counts.get("b"), counts.get("c"))
+
+
+def parse_set(spec):
+    """
+    {name: Scenario} for a SETS name or a `kind:ROWSxCOLS[:BOXES[:COLORS]],...`
+    list. Every scenario is built once (seed 0), so a board that cannot be
+    generated is rejected here rather than part‑way through a batch.
+    """
+    spec = SETS.get(spec, spec)
+    out = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, *fields = item.split(":")
+        if kind.lower() not in ("boxnet1", "boxnet2"):
+            raise ValueError(f"unknown scenario kind {kind!r} in {item!r}")
+        try:
+            if not 1 <= len(fields) <= 3:
+                raise ValueError
+            rows, cols = (int(v) for v in fields[0].lower().split("x"))
+            counts = [int(v) if v else None for v in fields[1:]]
+        except ValueError:
+            raise ValueError(f"{item!r} is not kind:ROWSxCOLS[:BOXES[:COLORS]]") from None
+        least = 2 if kind.lower() == "boxnet2" else 1
+        if rows < least or cols < least:
+            raise ValueError(f"{item!r}: a {kind} board needs at least {least}×{least}")
+        if any(n is not None and n < 1 for n in counts):
+            raise ValueError(f"{item!r}: box and colour counts must be at least 1")
+        scenario = Scenario(kind.lower(), rows, cols, *counts)
+        try:
+            scenario(0)
+        except (ValueError, AssertionError) as exc:
+            raise ValueError(f"{item!r}: {exc}") from None
+        out[scenario.name] = scenario
+    return out
@@ -86,12 +86,7 @@ def render_environment(screen, env):
 
     # Draw box counts
     font = pygame.font.SysFont("Arial", 16)
-    box_counts = defaultdict(int)
-    for box in env.boxes:
-        for pos in box.positions:
-            box_counts[pos] += 1
-
-    for (row, col), count in box_counts.items():
+    for (row, col), count in env.index.counts().items():
         x = MARGIN + col * (CELL_SIZE + MARGIN)
         y = MARGIN + row * (CELL_SIZE + MARGIN)
         label = font.render(f"{count}", True, COLORS["text"])
@@ -113,7 +108,7 @@ def simulate_plan(env, actions, delay=500):
     for step, (agent_id, color, from_pos, direction) in enumerate(actions):
         print(f"Step {step + 1}: Agent {agent_id} moves {color} box from {from_pos} {direction}")
         if color != "none":
-            box = next((b for b in env.boxes if b.color == color and from_pos in b.positions), None)
+            box = env.index.box(color, from_pos)
             if box:
                 env.move_box(box, from_pos, direction)
         render_environment(screen, env)
@@ -1,77 +1,26 @@
-import pygame
-import time
 import os
 import re
-from collections import defaultdict
 import json
 import argparse
-import simulate_boxnet2
-import pygame
-import time
+import executor
+import plan_parser
 
 # Import environment models
 from BoxNet1 import BoxNet1
 from BoxNet2_test import BoxNet2
 
-# Import planners
-from CMAS import runCMAS
-from HMAS1 import HMAS1
-from HMAS2 import HMAS2
-from DMAS import dmas_plan
+# pygame, simulate_boxnet2 and the planners are imported where they are
+# used, so a run loads only the planner it asked for and --headless never
+# loads pygame
 
 
 def parse_llm_plan(text):
-    actions = []
-
-    pattern_move = r".*?Agent (\d+): move (\w+) box from \((\d+), (\d+)\) to \((\d+), (\d+)\)(?: \[?(\w+)\]?)?"
-    pattern_nothing = r".*?Agent (\d+): do nothing"
-    pattern_move_to_goal = r".*?Agent (\d+): move (\w+) box to goal"
-
-    for line in text.strip().split('\n'):
-        move_match = re.match(pattern_move, line.strip())
-        nothing_match = re.match(pattern_nothing, line.strip())
-        move_to_goal_match = re.match(pattern_move_to_goal, line.strip())
-
-        if move_match:
-            agent_id = int(move_match.group(1))
-            color = move_match.group(2)
-            from_pos = (int(move_match.group(3)), int(move_match.group(4)))
-            to_pos = (int(move_match.group(5)), int(move_match.group(6)))
-
-            direction = move_match.group(7)
-            actions.append((agent_id, color, from_pos, direction))
-        
-        elif nothing_match:
-            agent_id = int(nothing_match.group(1))
-            actions.append((agent_id, "none", None, "stay"))
-        elif move_to_goal_match:
-            agent_id = int(move_to_goal_match.group(1))
-            color = move_to_goal_match.group(2)
-            actions.append((agent_id, color, None, "goal"))
-
-    return actions
+    return plan_parser.parse_plan(text)
 
 
 def execute_plan_silently(env, actions):
     """Execute the plan without visual output to check validity."""
-    for agent_id, color, from_pos, direction in actions:
-        if color == "none":
-            continue
-
-        if direction == "goal":
-            env.move_to_goal(color)
-            continue
-
-        # Find the box object
-        box = next((b for b in env.boxes if b.color == color and from_pos in b.positions), None)
-        if not box:
-            return False
-
-        success = env.move_box(box, from_pos, direction)
-        if not success:
-            return False
-
-    return True
+    return executor.execute_plan(env, actions).ok
 
 
 def run_planner(env, planner_name):
@@ -82,16 +31,19 @@ def run_planner(env, planner_name):
         response, tokens = call_llm(prompt)
         return response, 1, env
     elif planner_name == "DMAS":
+        from DMAS import dmas_plan
         #from DMAS import run_dmas
         #plan_text, total_tokens = run_dmas(env)
-        plan_text, api_calls = dmas_plan(env.boxes, env.goals)
-        return plan_text, api_calls, env
+        actions, api_calls, *_ = dmas_plan(env, env.boxes, env.goals)
+        return "\n".join(plan_parser.format_action(a) for a in actions), api_calls, env
     elif planner_name == "HMAS1":
+        from HMAS1 import HMAS1
         planner = HMAS1(environment_type="boxnet1" if isinstance(env, BoxNet1) else "boxnet2")
         planner.env = env
         plan, api_calls = planner.runHMAS1()
         return plan, api_calls, planner.env
     elif planner_name == "HMAS2":
+        from HMAS2 import HMAS2
         planner = HMAS2(environment_type="boxnet1" if isinstance(env, BoxNet1) else "boxnet2")
         planner.env = env
         plan, api_calls = planner.runHMAS2()
@@ -105,14 +57,14 @@ def run_planner(env, planner_name):
             planning_env = BoxNet2()
 
         prompt = intialPlan(planning_env)
-        response= call_llm(prompt)
+        response, _ = call_llm(prompt)
         actions = parse_llm_plan(response)
         # Keep replanning until successful
         attempts = 0
         while not execute_plan_silently(planning_env, actions) and attempts < 3:
             attempts += 1
             prompt = intialPlan(planning_env)
-            response += call_llm(prompt)
+            response += call_llm(prompt)[0]
             actions += parse_llm_plan(response)
         return response, attempts + 1, env  # Return the final successful plan
     else:
@@ -140,7 +92,8 @@ GRID_WIDTH = 4 * CELL_SIZE
 GRID_HEIGHT = 2 * CELL_SIZE
 
 def render_environment(screen, env):
-    
+    import pygame
+
     # Background
     screen.fill((255, 255, 255))
     pygame.draw.rect(screen, (0,0,0), (MARGIN, MARGIN, GRID_WIDTH, GRID_HEIGHT), width=5)
@@ -185,13 +138,7 @@ def render_environment(screen, env):
             pygame.draw.rect(screen, COLORS[box.color], box_rect)
 
     font = pygame.font.SysFont("Arial", 20)
-    box_counts = defaultdict(int)
-
-    # Count boxes at each cell (row, col)
-    for box in env.boxes:
-        for (row, col) in box.positions:
-            box_counts[(row, col)] += 1
-    for (row, col), count in box_counts.items():
+    for (row, col), count in env.index.counts().items():
         x = MARGIN + col * (CELL_SIZE + MARGIN)
         y = MARGIN + row * (CELL_SIZE + MARGIN)
         text = font.render((f"Box Count: {count}"), True, (0, 0, 0))  # black text
@@ -200,6 +147,7 @@ def render_environment(screen, env):
     pygame.display.flip()
 
 def simulate_plan(env, actions, delay=1000):
+    import pygame
     pygame.init()
     screen = pygame.display.set_mode((GRID_WIDTH + 2 * MARGIN, GRID_HEIGHT + 2 * MARGIN))
     pygame.display.set_caption("BoxNet1 Simulation")
@@ -213,7 +161,7 @@ def simulate_plan(env, actions, delay=1000):
 
         # Find the box object
         if color != "none":
-            box = next((b for b in env.boxes if b.color == color and from_pos in b.positions), None)
+            box = env.index.box(color, from_pos)
             if box:
                 env.move_box(box, from_pos, direction)
 
@@ -235,12 +183,30 @@ def simulate_plan(env, actions, delay=1000):
     pygame.quit()
 
 
+def show(env, actions, delay, headless=False):
+    """Animate *actions* on *env*, or just execute them and report with --headless."""
+    if headless:
+        result = executor.execute_plan(env, actions, stop_on_failure=False)
+        failed = sum(not step.ok for step in result.steps)
+        print(f"Executed {len(result.steps)} actions, {failed} failed"
+              + ("" if result.first_failure is None else f" (first at {result.first_failure})"))
+        return
+    if isinstance(env, BoxNet2):
+        import simulate_boxnet2
+        simulate_boxnet2.simulate_plan(env, actions, delay)
+        exit()
+    print(f"Simulating plan with {len(actions)} actions...")
+    simulate_plan(env, actions, delay)
+
+
 def main():
     parser = argparse.ArgumentParser(description="BoxNet Simulator")
     parser.add_argument("--env", choices=["boxnet1", "boxnet2"], default="boxnet2", help="Environment type")
     parser.add_argument("--planner", choices=["CMAS", "DMAS", "HMAS1", "HMAS2", "ETP"], default="HMAS2",
                         help="Planner type")
     parser.add_argument("--delay", type=int, default=500, help="Delay between steps (ms)")
+    parser.add_argument("--headless", action="store_true",
+                        help="execute the plan without opening a window (pygame is never imported)")
     args = parser.parse_args()
 
     # Create environment
@@ -253,13 +219,10 @@ def main():
     # Run planner
     print(f"Running {args.planner} on {args.env}...")
     if args.planner == "DMAS":
-        actions, api_calls, _ = dmas_plan(env, env.boxes, env.goals)
+        from DMAS import dmas_plan
+        actions, api_calls, *_ = dmas_plan(env, env.boxes, env.goals)
         if actions:
-            if isinstance(env, BoxNet2):
-                simulate_boxnet2.simulate_plan(env, actions, args.delay)
-                exit()
-            print(f"Simulating plan with {len(actions)} actions...")
-            simulate_plan(env, actions, args.delay)
+            show(env, actions, args.delay, args.headless)
             return
     plan_text, api_calls, env = run_planner(env, args.planner)
     
@@ -271,12 +234,8 @@ def main():
     actions = parse_llm_plan(plan_text)
     print(actions)
     # Simulate plan
-    if isinstance(env, BoxNet2):
-        simulate_boxnet2.simulate_plan(env, actions, args.delay)
-        exit()
-    if actions:
-        print(f"Simulating plan with {len(actions)} actions...")
-        simulate_plan(env, actions, args.delay)
+    if actions or isinstance(env, BoxNet2):
+        show(env, actions, args.delay, args.headless)
     else:
         print("No valid plan to simulate.")
 
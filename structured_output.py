@@ -0,0 +1,226 @@
+"""
+Structured (JSON‑schema) output mode for the planners.
+
+Instead of free‑text "- Agent [id]: move ..." lines the model returns
+
+    {"plan": [{"id": 4, "op": "m", "color": "blue", "x": 1, "y": 0, "dir": "R"}, ...]}
+
+where op is m(ove one cell) / g(oal) / n(othing) and dir is U/D/L/R.
+The schema is sent as a strict `json_schema` response_format to models
+with Structured Outputs (JSON_SCHEMA_MODELS); models with only JSON mode
+(JSON_OBJECT_MODELS, e.g. gpt-3.5-turbo) get `json_object`, and any other
+model (e.g. ETP's gpt-4) gets no response_format and relies on the prompt's
+format instructions. In every case `parse_structured` checks each action
+against the env (agent ids, colours, grid bounds) without any regex and
+rejects the bad ones.
+
+Accepted actions are rendered back into canonical plan lines, so the
+rest of each planner (HMAS‑2 line matching, DMAS history, the batch
+executor) runs unchanged.
+
+Completion tokens are recorded per (planner, mode) so the output‑token
+savings of this mode can be compared against free text. Inside
+`recording()` they go to that block's own counts (one batch trial, possibly
+in a worker process); the parent adds them to OUTPUT_TOKENS with `merge`.
+"""
+
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+
+import latency
+import llm
+from executor import grid_shape
+from plan_parser import Action, format_action
+
+OPS = {"m": "move", "g": "goal", "n": "nothing"}
+DIRS = {"U": "up", "D": "down", "L": "left", "R": "right"}
+
+INSTRUCTIONS = (
+    "\nRespond only with JSON of the form "
+    '{"plan": [{"id": agent id, "op": "m" | "g" | "n", "color": box color or null, '
+    '"x": row or null, "y": column or null, "dir": "U" | "D" | "L" | "R" or null}]}. '
+    'op "m" moves the box at (x, y) one cell in dir, "g" moves the box to its goal, '
+    '"n" does nothing.'
+)
+
+_lock = threading.Lock()
+OUTPUT_TOKENS = {}              # (planner, mode) → {"calls", "completion_tokens"}
+_current = contextvars.ContextVar("output_tokens", default=None)
+
+
+def _colors(env):
+    return sorted(set(env.goals) | {c for c, boxes in env.index.colors.items() if boxes})
+
+
+def plan_schema(env):
+    """JSON schema for a plan on *env*, with every field enum‑coded."""
+    nullable_int = {"type": ["integer", "null"]}
+    return {
+        "type": "object",
+        "properties": {
+            "plan": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id":    {"type": "integer"},
+                        "op":    {"type": "string", "enum": list(OPS)},
+                        "color": {"type": ["string", "null"], "enum": _colors(env) + [None]},
+                        "x":     nullable_int,
+                        "y":     nullable_int,
+                        "dir":   {"type": ["string", "null"], "enum": list(DIRS) + [None]},
+                    },
+                    "required": ["id", "op", "color", "x", "y", "dir"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["plan"],
+        "additionalProperties": False,
+    }
+
+
+# model families that accept response_format json_schema / json_object
+JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4o-mini", "gpt-4.1", "gpt-4.1-mini", "gpt-4.1-nano",
+                      "gpt-5", "o1", "o3", "o3-mini", "o4-mini")
+NO_JSON_SCHEMA = ("gpt-4o-2024-05-13", "o1-mini", "o1-preview")
+JSON_OBJECT_MODELS = ("gpt-4-turbo", "gpt-4-1106-preview", "gpt-4-0125-preview", "gpt-3.5-turbo")
+
+
+def _in_family(model, families):
+    return any(model == f or model.startswith(f + "-") for f in families)
+
+
+def response_format(env, model):
+    """The response_format *model* supports for a plan on *env*, or None."""
+    if _in_family(model, JSON_SCHEMA_MODELS) and not _in_family(model, NO_JSON_SCHEMA):
+        return {"type": "json_schema",
+                "json_schema": {"name": "boxnet_plan", "strict": True, "schema": plan_schema(env)}}
+    if _in_family(model, JSON_OBJECT_MODELS):
+        return {"type": "json_object"}
+    return None
+
+
+def _check(item, env, colors, rows, cols):
+    """Action for one JSON plan entry, or a string saying why it is invalid."""
+    if not isinstance(item, dict):
+        return "not an object"
+    aid, op = item.get("id"), item.get("op")
+    if not isinstance(aid, int) or not 0 <= aid < len(env.agents):
+        return f"unknown agent {aid!r}"
+    if op == "n":
+        return Action(aid, "none", None, "stay")
+    color = item.get("color")
+    if color not in colors:
+        return f"unknown color {color!r}"
+    if op == "g":
+        return Action(aid, color, None, "goal")
+    if op != "m":
+        return f"unknown op {op!r}"
+    x, y, d = item.get("x"), item.get("y"), item.get("dir")
+    if not (isinstance(x, int) and isinstance(y, int) and 0 <= x < rows and 0 <= y < cols):
+        return f"cell {(x, y)} outside the {rows}x{cols} grid"
+    if d not in DIRS:
+        return f"unknown direction {d!r}"
+    return Action(aid, color, (x, y), DIRS[d])
+
+
+def to_json(actions):
+    """The structured reply for *actions* (the inverse of parse_structured)."""
+    dir_codes = {v: k for k, v in DIRS.items()}
+    plan = []
+    for agent_id, color, from_pos, direction in actions:
+        if color == "none":
+            plan.append({"id": agent_id, "op": "n", "color": None, "x": None, "y": None, "dir": None})
+        elif direction == "goal":
+            plan.append({"id": agent_id, "op": "g", "color": color, "x": None, "y": None, "dir": None})
+        else:
+            plan.append({"id": agent_id, "op": "m", "color": color, "x": from_pos[0],
+                         "y": from_pos[1], "dir": dir_codes.get(direction)})
+    return json.dumps({"plan": plan})
+
+
+@latency.timed("parse")
+def parse_structured(text, env):
+    """
+    Validate a structured reply against *env*.
+    Returns (actions, rejected) where *rejected* lists (entry, reason).
+    """
+    try:
+        # without a response_format the object may come wrapped in prose or a code fence
+        plan = json.loads(text[text.index("{"):text.rindex("}") + 1])["plan"]
+    except (ValueError, KeyError, TypeError):
+        return [], [(text, "not a JSON plan")]
+    colors = set(_colors(env))
+    rows, cols = grid_shape(env)
+    actions, rejected = [], []
+    for item in plan if isinstance(plan, list) else []:
+        result = _check(item, env, colors, rows, cols)
+        if isinstance(result, str):
+            rejected.append((item, result))
+        else:
+            actions.append(result)
+    return actions, rejected
+
+
+def complete_plan(messages, env, model, planner, **opts):
+    """
+    Structured‑mode chat call. The format instructions are appended to the
+    last message. Returns (text, usage, actions), where *text* is the
+    accepted actions rendered as canonical plan lines.
+    """
+    messages = messages[:-1] + [dict(messages[-1], content=messages[-1]["content"] + INSTRUCTIONS)]
+    fmt = response_format(env, model)
+    if fmt is not None:
+        opts["response_format"] = fmt
+    raw, usage = llm.complete(messages, model=model, **opts)
+    record_output(planner, "structured", usage)
+    actions, rejected = parse_structured(raw, env)
+    for item, reason in rejected:
+        print(f"⚠️ Rejected {planner} action {item}: {reason}")
+    return "\n".join(format_action(a) for a in actions), usage, actions
+
+
+def record_output(planner, mode, usage):
+    """Count one call's completion tokens under (planner, mode)."""
+    counts = _current.get()
+    with _lock:
+        entry = (OUTPUT_TOKENS if counts is None else counts).setdefault(
+            (planner, mode), {"calls": 0, "completion_tokens": 0})
+        entry["calls"] += 1
+        entry["completion_tokens"] += usage["completion_tokens"]
+
+
+@contextmanager
+def recording():
+    """Count the block's calls in a fresh dict (yielded) instead of OUTPUT_TOKENS."""
+    counts = {}
+    token = _current.set(counts)
+    try:
+        yield counts
+    finally:
+        _current.reset(token)
+
+
+def merge(counts):
+    """Add counts from `recording()` (e.g. a worker's trial) to OUTPUT_TOKENS."""
+    with _lock:
+        for key, value in counts.items():
+            entry = OUTPUT_TOKENS.setdefault(key, {"calls": 0, "completion_tokens": 0})
+            entry["calls"] += value["calls"]
+            entry["completion_tokens"] += value["completion_tokens"]
+
+
+def output_token_report():
+    """Mean completion tokens per call, by planner and mode, with savings."""
+    with _lock:
+        means = {key: v["completion_tokens"] / v["calls"] for key, v in OUTPUT_TOKENS.items() if v["calls"]}
+    report = {}
+    for (planner, mode), mean in sorted(means.items()):
+        report.setdefault(planner, {})[mode] = round(mean, 1)
+    for modes in report.values():
+        if "text" in modes and "structured" in modes and modes["text"]:
+            modes["saved_pct"] = round(100.0 * (1 - modes["structured"] / modes["text"]), 1)
+    return report
@@ -0,0 +1,143 @@
+"""
+Cassettes: files survive a run that is killed while recording, and a
+replay prices every call as the recorded run did.
+
+The kill tests record in a child process that SIGKILLs itself part‑way
+through a trial, as an interrupted `batch_testing.py --record` run would be.
+"""
+
+import gzip
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cassette  # noqa: E402
+import ledger  # noqa: E402
+import llm  # noqa: E402
+
+needs_sigkill = pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+
+
+def calls(n):
+    return [{"key": f"k{n}", "model": "m", "messages": [{"role": "user", "content": f"p{n}"}],
+             "response": f"r{n}" * 50, "usage": {"total_tokens": n}}]
+
+
+def killed_run(path, finished, old_format=False):
+    """Record *finished* trials, start one more, and die with SIGKILL mid‑write."""
+    script = textwrap.dedent(f"""
+        import gzip, json, os, signal, sys
+        sys.path.insert(0, {ROOT!r})
+        import cassette
+        from tests.test_cassette import calls
+        path = {str(path)!r}
+        if {old_format!r}:
+            # the former writer: one gzip stream, flushed after each trial
+            f = gzip.open(path, "wt", encoding="utf-8")
+            for n in range({finished}):
+                f.write(json.dumps({{"environment": "BoxNet1", "framework": "CMAS",
+                                    "trial": n, "calls": calls(n)}}) + "\\n")
+                f.flush()
+            f.write('{{"environment": "BoxNet1", "framework": "CMAS", "trial": 99, "ca')
+            f.flush()
+        else:
+            f = cassette.open_writer(path)
+            for n in range({finished}):
+                cassette.write_trial(f, "BoxNet1", "CMAS", n, calls(n))
+            line = json.dumps({{"environment": "BoxNet1", "framework": "CMAS",
+                               "trial": 99, "calls": calls(99)}}) + "\\n"
+            member = gzip.compress(line.encode())
+            f.write(member[:len(member) // 2])
+            f.flush()
+        os.kill(os.getpid(), signal.SIGKILL)
+    """)
+    proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT)
+    assert proc.returncode == -signal.SIGKILL
+
+
+@needs_sigkill
+@pytest.mark.parametrize("old_format", [False, True])
+def test_killed_run_keeps_finished_trials(tmp_path, old_format):
+    path = tmp_path / "run.cassette.gz"
+    killed_run(path, 3, old_format)
+    trials = cassette.load(path)
+    assert sorted(trials) == [("BoxNet1", "CMAS", n) for n in range(3)]
+    assert trials[("BoxNet1", "CMAS", 2)] == calls(2)
+
+
+@needs_sigkill
+@pytest.mark.parametrize("old_format", [False, True])
+def test_resume_after_kill_appends_and_reloads(tmp_path, old_format):
+    path = tmp_path / "run.cassette.gz"
+    killed_run(path, 3, old_format)
+    with cassette.open_writer(path, append=True) as f:
+        for n in range(3, 5):
+            cassette.write_trial(f, "BoxNet1", "CMAS", n, calls(n))
+    trials = cassette.load(path)
+    assert sorted(trials) == [("BoxNet1", "CMAS", n) for n in range(5)]
+    # the repaired file is plain multi‑member gzip again
+    assert len(gzip.decompress(path.read_bytes()).splitlines()) == 5
+
+
+def test_save_load_round_trip(tmp_path):
+    path = tmp_path / "run.cassette.gz"
+    trials = {("BoxNet2", "ETP", n): calls(n) for n in range(4)}
+    cassette.save(path, trials)
+    assert cassette.load(path) == trials
+
+
+class FakeClient:
+    """Answers every request with the same reply; counts the requests it saw."""
+
+    def __init__(self):
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream=False, **kwargs):
+        self.requests += 1
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=200, total_tokens=1200)
+        if stream:
+            return iter([SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="plan"))]),
+                         SimpleNamespace(usage=usage, choices=[])])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="plan"))], usage=usage)
+
+    def close(self):
+        pass
+
+
+def run_calls():
+    """A real call, its cache hit, a real stream and its cache hit; ledger costs in order."""
+    book = ledger.Ledger()
+    with ledger.recording(book):
+        for prompt in ("a", "a"):
+            llm.complete([{"role": "user", "content": prompt}], model="gpt-4o", temperature=0)
+        for prompt in ("b", "b"):
+            "".join(llm.stream([{"role": "user", "content": prompt}], model="gpt-4o", temperature=0))
+    return [(e["cost_usd"], e["cached"]) for e in book.entries]
+
+
+def test_replay_keeps_recorded_cost(tmp_path):
+    llm.configure(cache_path=str(tmp_path / "cache.sqlite"))
+    try:
+        llm._client = client = FakeClient()
+        tape = cassette.Tape()
+        with cassette.using(tape):
+            recorded = run_calls()
+        assert client.requests == 2
+        assert [cached for _, cached in recorded] == [False, True, False, True]
+
+        llm._client = client = FakeClient()
+        with cassette.using(cassette.Tape(tape.calls)):
+            replayed = run_calls()
+        assert client.requests == 0
+        assert replayed == recorded
+    finally:
+        llm.configure(cache_path=None)
@@ -0,0 +1,150 @@
+"""
+Timeline spans for whole batch runs, written as Chrome Trace Event JSON
+(open in https://ui.perfetto.dev or chrome://tracing).
+
+•  off by default; `enable()` turns recording on for this process
+•  `with span(name, cat, **args):` / `@traced(name, cat)` record nested
+   spans per thread: trial → round → agent → llm / prompt / parse / execute
+•  `annotate(**args)` adds arguments to the innermost open span
+•  `write(path)` dumps every recorded span
+
+While disabled, `span` returns a shared no‑op context manager and `traced`
+adds one flag check per call.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+_enabled = False
+_worker = False
+_offset = 0.0             # perf_counter → epoch seconds, so processes line up
+_events = []
+_lock = threading.Lock()
+_args = contextvars.ContextVar("trace_args", default=None)
+_NULL = nullcontext()
+
+
+def enable(worker=False):
+    """Start recording; *worker* marks a pool process whose spans are drained per trial."""
+    global _enabled, _worker, _offset
+    _offset = time.time() - time.perf_counter()
+    _worker = worker
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def is_worker():
+    return _enabled and _worker
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "t0", "token")
+
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        self.token = _args.set(self.args)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter() - self.t0
+        _args.reset(self.token)
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        add(self.name, self.cat, self.t0, dur, self.args)
+        return False
+
+
+def span(name, cat="", **args):
+    """Context manager recording one span (a no‑op while disabled)."""
+    if not _enabled:
+        return _NULL
+    return _Span(name, cat, args)
+
+
+def traced(name=None, cat=""):
+    """Decorator: record every call of the function as a span."""
+    def deco(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(label, cat, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def annotate(**args):
+    """Attach *args* to the innermost open span of this thread."""
+    if _enabled:
+        current = _args.get()
+        if current is not None:
+            current.update(args)
+
+
+def add(name, cat, start, dur, args=None):
+    """Record a finished span that began at perf_counter() *start* and lasted *dur* s."""
+    if not _enabled:
+        return
+    event = {"name": name, "cat": cat, "ph": "X",
+             "ts": round((start + _offset) * 1e6, 1), "dur": round(dur * 1e6, 1),
+             "pid": os.getpid(), "tid": threading.get_ident(), "args": args or {}}
+    with _lock:
+        _events.append(event)
+
+
+def drain():
+    """Remove and return the spans recorded so far (for shipping out of a worker)."""
+    global _events
+    with _lock:
+        events, _events = _events, []
+    return events
+
+
+def extend(events):
+    """Add spans recorded by another process."""
+    with _lock:
+        _events.extend(events)
+
+
+def write(path):
+    """Write every recorded span as Chrome Trace Event JSON; returns the span count."""
+    with _lock:
+        events = sorted(_events, key=lambda e: e["ts"])
+    # thread idents are huge and reused; number threads per process instead
+    tids, meta, out = {}, [], []
+    main_pid = os.getpid()
+    for e in events:
+        e = dict(e)
+        key = (e["pid"], e["tid"])
+        if key not in tids:
+            tids[key] = sum(1 for p, _ in tids if p == e["pid"]) + 1
+            meta.append({"name": "thread_name", "ph": "M", "pid": e["pid"], "tid": tids[key],
+                         "args": {"name": f"thread {tids[key]}"}})
+            if tids[key] == 1:
+                label = "batch" if e["pid"] == main_pid else f"worker {e['pid']}"
+                meta.append({"name": "process_name", "ph": "M", "pid": e["pid"],
+                             "args": {"name": label}})
+        e["tid"] = tids[key]
+        out.append(e)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": meta + out, "displayTimeUnit": "ms"}, f)
+    return len(out)
@@ -0,0 +1,195 @@
+"""
+K BoxNet boards stepped together, for scoring many plans offline.
+
+•  `VecEnv(envs)` – K envs of one kind and grid size as stacked arrays:
+   occ / goal [K, colors, rows, cols], has_goals / cleared [K, colors]
+   (the layout of array_state.ArrayState); `VecEnv.repeat(env, k)` is K
+   copies of one board
+•  `load(plans)` resets to the initial boards; each `step()` then advances
+   every env by one action of its plan in one call and returns a VecStep
+   of ok / done / failed masks (`step(actions)` takes a raw [K, 4] array)
+•  `run(plans)` – load and step until every env is done; returns a
+   VecResult of per‑env arrays
+•  `score(env, plans)` / `best_plan(env, plans)` – every candidate plan on
+   a copy of one board, e.g. to vote between sampled plans
+
+Each env follows executor.execute_plan (stop at the first failure unless
+stop_on_failure=False) and success_pct matches batch_testing.success_pct.
+A goal action for a colour no env has is rejected, as in ArrayState.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from array_state import ArrayState, BAD, DC, DR, GOAL, NONE, OPS
+
+PAD = BAD + 1          # no action: the env's plan has ended or it has failed
+
+
+class VecStep(NamedTuple):
+    ok: np.ndarray       # [K] the action was valid (True for padding)
+    done: np.ndarray     # [K] the env will take no further action
+    failed: np.ndarray   # [K] some action of the env has failed
+
+
+class VecResult(NamedTuple):
+    ok: np.ndarray             # [K] every executed action succeeded
+    first_failure: np.ndarray  # [K] index of the first failing action, or -1
+    steps: np.ndarray          # [K] actions executed (execute_plan's len(steps))
+    success_pct: np.ndarray    # [K] boxes on goals / colours cleared, in percent
+
+
+class VecEnv:
+    def __init__(self, envs, repeats=None):
+        states = [ArrayState(env) for env in envs]
+        if not states:
+            raise ValueError("VecEnv needs at least one env")
+        if len({(s.boxnet2, s.rows, s.cols) for s in states}) > 1:
+            raise ValueError("VecEnv envs must share one kind and grid size")
+        first = states[0]
+        self.boxnet2, self.rows, self.cols = first.boxnet2, first.rows, first.cols
+        self.colors = list(dict.fromkeys(c for s in states for c in s.colors))
+        self.color_index = {c: i for i, c in enumerate(self.colors)}
+
+        def stack(name):
+            rows = []
+            for s in states:
+                arr = getattr(s, name)
+                wide = np.zeros((len(self.colors),) + arr.shape[1:], dtype=arr.dtype)
+                wide[[self.color_index[c] for c in s.colors]] = arr
+                rows.append(wide)
+            return np.repeat(np.stack(rows), repeats or 1, axis=0)
+
+        self._initial = {name: stack(name) for name in ("occ", "goal", "has_goals", "cleared")}
+        self.k = len(self._initial["occ"])
+        self._rows = np.arange(self.k)
+        self.plans = None
+        self.reset()
+
+    @classmethod
+    def repeat(cls, env, k):
+        """*k* copies of one board."""
+        return cls([env], repeats=k)
+
+    def reset(self):
+        """Back to the boards the VecEnv was built from."""
+        for name, arr in self._initial.items():
+            setattr(self, name, arr.copy())
+        self.t = 0
+        self.failed = np.zeros(self.k, dtype=bool)
+        self.first_failure = np.full(self.k, -1)
+        self.steps = np.zeros(self.k, dtype=np.int64)
+
+    def encode(self, plans):
+        """int32 array [K, T, 4] of (color, row, col, op), padded with PAD."""
+        lengths = np.array([len(p) for p in plans], dtype=np.int64)
+        out = np.full((len(plans), lengths.max(initial=0), 4), -1, dtype=np.int32)
+        out[..., 3] = PAD
+        ci, seen = self.color_index, {}
+
+        def code(action):
+            # candidate plans repeat most of their actions
+            key = action[1:]
+            try:
+                return seen[key]
+            except KeyError:
+                _, color, from_pos, direction = action
+                row = (ci.get(color, -1), *(from_pos if from_pos is not None else (-1, -1)),
+                       NONE if color == "none" else OPS.get(direction, BAD))
+                seen[key] = row
+                return row
+            except TypeError:      # unhashable from_pos (a list)
+                return code((action[0], action[1], tuple(action[2]), action[3]))
+
+        flat = [code(a) for plan in plans for a in plan]
+        if flat:
+            starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            t = np.arange(len(flat)) - starts
+            out[np.repeat(np.arange(len(plans)), lengths), t] = flat
+        return out
+
+    def load(self, plans, stop_on_failure=True):
+        """Reset, then plan k (action tuples, or a row of `encode`) runs on env k."""
+        self.reset()
+        self.plans = plans if isinstance(plans, np.ndarray) else self.encode(plans)
+        if len(self.plans) != self.k:
+            raise ValueError(f"{len(self.plans)} plans for {self.k} envs")
+        self.lengths = (self.plans[..., 3] != PAD).sum(axis=1)
+        self.stop_on_failure = stop_on_failure
+
+    def step(self, actions=None):
+        """One action per env: *actions* [K, 4], or the next actions of the loaded plans."""
+        if actions is None:
+            t = self.t
+            actions = self.plans[:, t] if t < self.plans.shape[1] else np.full((self.k, 4), PAD)
+            if self.stop_on_failure and self.failed.any():
+                actions = actions.copy()
+                actions[self.failed, 3] = PAD
+        c, r, col, op = actions.T
+        k = self._rows
+        move = op < 4
+        d = np.where(move, op, 0)
+        nr, nc = r + DR[d], col + DC[d]
+        inside = ((r >= 0) & (r < self.rows) & (col >= 0) & (col < self.cols)
+                  & (nr >= 0) & (nr < self.rows) & (nc >= 0) & (nc < self.cols))
+        sel = move & inside & (c >= 0)
+        moved = np.zeros(self.k, dtype=bool)
+        moved[sel] = self.occ[k[sel], c[sel], r[sel], col[sel]] > 0
+        ok = moved | (op == NONE) | (op == PAD) | ((op == GOAL) & (c >= 0) & self.boxnet2)
+
+        k, c, r, col, nr, nc = k[moved], c[moved], r[moved], col[moved], nr[moved], nc[moved]
+        self.occ[k, c, r, col] -= 1
+        self.occ[k, c, nr, nc] += 1
+        if self.boxnet2:
+            # a colour is cleared by the goal action or by a box landing on a goal corner
+            landed = self.goal[k, c, nr, nc]
+            goal = ok & (op == GOAL)
+            kk = np.r_[k[landed], self._rows[goal]]
+            cc = np.r_[c[landed], actions[goal, 0]]
+            self.occ[kk, cc] = 0
+            self.goal[kk, cc] = False
+            self.has_goals[kk, cc] = True
+            self.cleared[kk, cc] = True
+
+        self.steps += op != PAD
+        self.first_failure[~ok & (self.first_failure < 0)] = self.t
+        self.failed |= ~ok
+        self.t += 1
+        if self.plans is None:
+            done = np.zeros(self.k, dtype=bool)
+        else:
+            done = self.t >= self.lengths
+            if self.stop_on_failure:
+                done |= self.failed
+        return VecStep(ok, done, self.failed.copy())
+
+    def success_pct(self):
+        """[K] boxes on goals (BoxNet1) or colours cleared (BoxNet2), in percent."""
+        if self.boxnet2:
+            hit, total = (self.cleared & self.has_goals).sum(axis=1), self.has_goals.sum(axis=1)
+        else:
+            hit, total = (self.goal & (self.occ > 0)).sum(axis=(1, 2, 3)), self.goal.sum(axis=(1, 2, 3))
+        return np.divide(100.0 * hit, total, out=np.zeros(self.k), where=total > 0)
+
+    def result(self):
+        return VecResult(~self.failed, self.first_failure.copy(), self.steps.copy(), self.success_pct())
+
+    def run(self, plans, stop_on_failure=True):
+        """Execute plan k on env k and return a VecResult."""
+        self.load(plans, stop_on_failure)
+        while self.t < self.plans.shape[1]:
+            if self.step().done.all():
+                break
+        return self.result()
+
+
+def score(env, plans, stop_on_failure=True):
+    """VecResult of every plan in *plans* executed on its own copy of *env*."""
+    return VecEnv.repeat(env, len(plans)).run(plans, stop_on_failure)
+
+
+def best_plan(env, plans):
+    """Index of the plan with the highest success, then no failure, then fewest steps."""
+    res = score(env, plans)
+    return int(np.lexsort((res.steps, res.first_failure >= 0, -res.success_pct))[0])